@@ -0,0 +1,42 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from rest_framework.permissions import SAFE_METHODS
+
+from .middleware import collect_queries
+
+
+def render_in_thread(view, request, *args, **kwargs):
+    """Выполняет и рендерит представление в отдельном потоке,
+    закрывая соединение с БД этого потока, как в конце запроса.
+    Запросы к БД учитываются в метриках текущего запроса."""
+    close_old_connections()
+    try:
+        with collect_queries():
+            response = view(request, *args, **kwargs)
+            if callable(getattr(response, 'render', None)):
+                response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """Делает представление асинхронным для ASGI-сервера.
+
+    Под ASGI Django выполняет синхронные представления в одном потоке
+    на процесс, поэтому медленный запрос задерживает все остальные.
+    Читающие запросы этого представления выполняются в пуле потоков
+    параллельно, изменяющие — в общем потоке, как раньше.
+    """
+    read = sync_to_async(render_in_thread, thread_sensitive=False)
+    write = sync_to_async(view)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await read(view, request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,64 @@
+import hashlib
+
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from foodgram.settings import CATALOG_CACHE_MAX_AGE
+
+
+def make_etag(*parts) -> str:
+    """Собирает ETag из частей, от которых зависит ответ."""
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def not_modified(request, etag: str, last_modified=None):
+    """Возвращает ответ 304, если у клиента актуальная версия."""
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=last_modified and int(last_modified.timestamp())
+    )
+
+
+def set_validators(response, etag: str, last_modified=None,
+                   public: bool = False):
+    """Добавляет в ответ ETag, Last-Modified и Cache-Control.
+
+    Публичные ответы не зависят от пользователя и кэшируются
+    на CATALOG_CACHE_MAX_AGE секунд. Остальные ответы браузер обязан
+    перепроверять, а прокси не должны отдавать их другим пользователям.
+    """
+    if response.status_code not in (200, 304):
+        return response
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    if public:
+        patch_cache_control(
+            response, public=True, max_age=CATALOG_CACHE_MAX_AGE)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+class ConditionalCatalogMixin:
+    """Отвечает 304 на запросы неизменившегося справочника."""
+
+    def get_validators(self) -> tuple:
+        """Возвращает ETag и дату последнего изменения справочника."""
+        raise NotImplementedError
+
+    def conditional(self, request, handler, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified, public=True)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, super().retrieve, *args, **kwargs)
@@ -0,0 +1,81 @@
+import os
+import tempfile
+
+from django.http import Http404
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+
+DERIVATIVES_DIR = 'derivatives'
+# Вариант изображения и максимальные ширина и высота в пикселях.
+VARIANTS = {
+    'thumb': (160, 160),
+    'card': (480, 480),
+    'card_2x': (960, 960),
+}
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpg': ('JPEG', 'image/jpeg'),
+}
+QUALITY = 80
+
+
+def get_storage():
+    return Recipe._meta.get_field('image').storage
+
+
+def get_derivative_name(name: str, variant: str, extension: str) -> str:
+    """Имя варианта однозначно задается именем оригинала, поэтому
+    новое изображение рецепта всегда получает новые адреса вариантов."""
+    return f'{DERIVATIVES_DIR}/{variant}/{name}.{extension}'
+
+
+def get_derivative_urls(image) -> dict:
+    """Возвращает адреса всех вариантов изображения по форматам."""
+    if not image:
+        return {}
+    storage = get_storage()
+    return {
+        variant: {
+            extension: storage.url(
+                get_derivative_name(image.name, variant, extension))
+            for extension in FORMATS
+        }
+        for variant in VARIANTS
+    }
+
+
+def render_derivative(variant: str, name: str) -> tuple:
+    """Возвращает путь к файлу варианта и его MIME-тип, при первом
+    запросе создавая файл из оригинала.
+
+    Файл записывается во временный и переименовывается, поэтому
+    параллельные запросы не увидят его недописанным.
+    """
+    original, _, extension = name.rpartition('.')
+    if variant not in VARIANTS or extension not in FORMATS:
+        raise Http404
+    image_format, content_type = FORMATS[extension]
+    storage = get_storage()
+    path = storage.path(get_derivative_name(original, variant, extension))
+    if os.path.exists(path):
+        return path, content_type
+    if not Recipe.objects.filter(image=original).exists():
+        raise Http404
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with storage.open(original) as source, Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(VARIANTS[variant], Image.LANCZOS)
+        if image_format == 'JPEG':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        with tempfile.NamedTemporaryFile(
+                dir=os.path.dirname(path), delete=False) as output:
+            try:
+                image.save(output, image_format, quality=QUALITY)
+            except Exception:
+                os.unlink(output.name)
+                raise
+    os.replace(output.name, path)
+    return path, content_type
@@ -0,0 +1,99 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Поле id, которое в списке разрешается в объекты одним запросом.
+
+    С many=True все id проверяются одним запросом IN. Внутри вложенного
+    сериализатора со списком BulkRelatedListSerializer объекты
+    загружаются заранее для всех элементов списка, а поле только
+    достает их из загруженных.
+    """
+
+    default_error_messages = {
+        'does_not_exist_many': 'Объекты с id {pk_values} не существуют.',
+    }
+
+    def __init__(self, **kwargs):
+        self.resolved = None
+        super().__init__(**kwargs)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_pk(self, data):
+        """Приводит значение к типу первичного ключа без запроса к базе."""
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.get_queryset().model._meta.pk.to_python(data)
+        except (TypeError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+    def resolve(self, values) -> None:
+        """Загружает объекты для всех корректных id одним запросом."""
+        pks = set()
+        for value in values:
+            try:
+                pks.add(self.to_pk(value))
+            except serializers.ValidationError:
+                pass
+        pks.discard(None)
+        self.resolved = self.get_queryset().in_bulk(pks)
+
+    def to_internal_value(self, data):
+        if self.resolved is None:
+            return super().to_internal_value(data)
+        pk = self.to_pk(data)
+        if pk not in self.resolved:
+            self.fail('does_not_exist', pk_value=pk)
+        return self.resolved[pk]
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список id, проверяемый одним запросом; в ошибке перечисляются
+    сразу все несуществующие id."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        pks = [child.to_pk(item) for item in data]
+        objects = child.get_queryset().in_bulk(set(pks))
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            child.fail('does_not_exist_many', pk_values=missing)
+        return [objects[pk] for pk in pks]
+
+
+class BulkRelatedListSerializer(serializers.ListSerializer):
+    """Список вложенных объектов, поля BulkPrimaryKeyRelatedField
+    которых разрешаются одним запросом на весь список."""
+
+    def to_internal_value(self, data):
+        fields = [
+            field for field in self.child.fields.values()
+            if isinstance(field, BulkPrimaryKeyRelatedField)
+            and not field.read_only
+        ]
+        if isinstance(data, list):
+            for field in fields:
+                field.resolve(
+                    item.get(field.field_name) for item in data
+                    if isinstance(item, dict))
+        try:
+            return super().to_internal_value(data)
+        finally:
+            for field in fields:
+                field.resolved = None
@@ -1,13 +1,27 @@
+from django import forms
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from foodgram.settings import RECIPE_INDEX_MAX_IDS
+from recipes import search
+from recipes.models import IngredientRecipe, Recipe, Tag
+from users.models import User
+
+from .indexes import recipe_ingredient_index
+
+
+class IdListFilter(filters.BaseInFilter, filters.NumberFilter):
+    """Список id через запятую."""
+
+    field_class = forms.IntegerField
 
 
 class RecipeFilter(filters.FilterSet):
     """Фильтрация рецептов по определенным полям."""
 
-    author = filters.AllValuesMultipleFilter(
-        field_name='author__id',
+    author = filters.ModelMultipleChoiceFilter(
+        field_name='author',
+        queryset=User.objects.all(),
         label='Автор')
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
@@ -15,6 +29,14 @@ class RecipeFilter(filters.FilterSet):
         label='Тег',
         to_field_name='slug'
     )
+    ingredients = IdListFilter(
+        method='get_ingredients', label='Содержит все ингредиенты')
+    exclude_ingredients = IdListFilter(
+        method='get_exclude_ingredients', label='Не содержит ингредиенты')
+    max_cooking_time = filters.NumberFilter(
+        field_name='cooking_time', lookup_expr='lte',
+        label='Время приготовления не больше')
+    search = filters.CharFilter(method='get_search', label='Поиск')
     is_favorited = filters.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
@@ -22,13 +44,54 @@ class RecipeFilter(filters.FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'ingredients', 'exclude_ingredients', 'max_cooking_time',
+                  'search')
+
+    def get_ingredients(self, queryset, name, value):
+        """Берет id рецептов с нужными ингредиентами из индекса в памяти,
+        исключаемые ингредиенты вычитаются там же. Теги, автор и время
+        приготовления применяются в том же запросе, что и выборка
+        рецептов по id.
+
+        Если рецептов больше RECIPE_INDEX_MAX_IDS, список id был бы
+        слишком длинным для параметров запроса, и ингредиенты
+        проверяет база подзапросами EXISTS.
+        """
+        exclude = self.form.cleaned_data.get('exclude_ingredients') or ()
+        ids = recipe_ingredient_index.match(value, exclude)
+        if len(ids) <= RECIPE_INDEX_MAX_IDS:
+            return queryset.filter(pk__in=ids)
+        for ingredient_id in set(value):
+            queryset = queryset.filter(Exists(IngredientRecipe.objects.filter(
+                recipe=OuterRef('pk'), ingredient_id=ingredient_id)))
+        return self.without_ingredients(queryset, exclude)
+
+    def get_exclude_ingredients(self, queryset, name, value):
+        """Без списка нужных ингредиентов исключение выполняет база:
+        id всех рецептов с исключаемым ингредиентом могут занять
+        слишком длинный список."""
+        if self.form.cleaned_data.get('ingredients'):
+            return queryset
+        return self.without_ingredients(queryset, value)
+
+    @staticmethod
+    def without_ingredients(queryset, ingredient_ids):
+        if not ingredient_ids:
+            return queryset
+        return queryset.exclude(Exists(IngredientRecipe.objects.filter(
+            recipe=OuterRef('pk'), ingredient_id__in=ingredient_ids)))
+
+    def get_search(self, queryset, name, value):
+        """Ищет рецепты по названию и описанию, сортируя
+        по релевантности и популярности."""
+        return search.search(queryset, value)
 
     def get_is_favorited(self, queryset, name, value):
         """Показывает рецепты, добавленные в избранное."""
         if self.request.user.is_authenticated:
             if value:
-                return queryset.filter(favorite__user=self.request.user)
+                return queryset.filter(is_favorited=True)
             return queryset
         else:
             return queryset
@@ -37,17 +100,7 @@ class RecipeFilter(filters.FilterSet):
         """Показывает рецепты, добавленные в список покупок."""
         if self.request.user.is_authenticated:
             if value:
-                return queryset.filter(shopping_cart__user=self.request.user)
+                return queryset.filter(is_in_shopping_cart=True)
             return queryset
         else:
             return queryset
-
-
-class IngredientSearchFilter(filters.FilterSet):
-    """Фильтр поиска по названию ингредиента."""
-
-    name = filters.CharFilter(lookup_expr='istartswith')
-
-    class Meta:
-        model = Ingredient
-        fields = ('name', )
@@ -0,0 +1,285 @@
+import base64
+import binascii
+import logging
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from django.core.files import File
+from django.core.files.uploadedfile import UploadedFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework.exceptions import ValidationError
+
+from foodgram.settings import IMAGE_MAX_PIXELS, IMAGE_MAX_SIZE, IMAGE_WORKERS
+from recipes.models import Recipe
+from recipes.versions import bump_version
+
+logger = logging.getLogger(__name__)
+
+BASE64_MARKER = ';base64,'
+# Кратно 4, чтобы каждый кусок декодировался независимо.
+DECODE_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 1024 * 1024
+ALLOWED_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+JPEG_QUALITY = 85
+QUEUE_PER_WORKER = 4
+EXIF_ORIENTATION_TAG = 0x0112
+EXIF_HEADER = b'Exif\x00\x00'
+# Сегменты JPEG с метаданными: APP1 (EXIF, XMP), APP13 (IPTC), COM.
+JPEG_METADATA_MARKERS = {0xE1, 0xED, 0xFE}
+JPEG_SOS = 0xDA
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_METADATA_CHUNKS = {b'eXIf', b'tEXt', b'iTXt', b'zTXt', b'tIME'}
+WEBP_METADATA_CHUNKS = {b'EXIF', b'XMP '}
+# Флаги EXIF и XMP в заголовке VP8X.
+WEBP_METADATA_FLAGS = 0x08 | 0x04
+
+executor = ThreadPoolExecutor(
+    max_workers=IMAGE_WORKERS, thread_name_prefix='image')
+slots = threading.BoundedSemaphore(IMAGE_WORKERS * QUEUE_PER_WORKER)
+
+
+def copy(source, target, size: int = None) -> None:
+    """Копирует size байт или весь остаток файла кусками."""
+    while size is None or size > 0:
+        chunk = source.read(
+            DECODE_CHUNK_SIZE if size is None
+            else min(size, DECODE_CHUNK_SIZE))
+        if not chunk:
+            return
+        target.write(chunk)
+        if size is not None:
+            size -= len(chunk)
+
+
+def read_exactly(file, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise ValidationError('Загрузите корректное изображение.')
+    return data
+
+
+def read_chunk_header(file):
+    """Читает 8-байтовый заголовок чанка PNG или RIFF. В конце файла
+    возвращает None."""
+    header = file.read(8)
+    if header and len(header) != 8:
+        raise ValidationError('Загрузите корректное изображение.')
+    return header or None
+
+
+def strip_jpeg(source, target, orientation: int) -> None:
+    """Копирует JPEG без сегментов метаданных. Поворот из EXIF
+    сохраняется в минимальном сегменте APP1: его применит
+    перекодирование."""
+    target.write(read_exactly(source, 2))
+    if orientation not in (None, 1):
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION_TAG] = orientation
+        payload = exif.tobytes()
+        if not payload.startswith(EXIF_HEADER):
+            payload = EXIF_HEADER + payload
+        target.write(struct.pack('>BBH', 0xFF, 0xE1, len(payload) + 2))
+        target.write(payload)
+    while True:
+        marker = read_exactly(source, 2)
+        if marker[0] != 0xFF:
+            raise ValidationError('Загрузите корректное изображение.')
+        if marker[1] == 0xFF:
+            source.seek(-1, os.SEEK_CUR)
+            continue
+        length_bytes = read_exactly(source, 2)
+        length = struct.unpack('>H', length_bytes)[0] - 2
+        if marker[1] in JPEG_METADATA_MARKERS:
+            source.seek(length, os.SEEK_CUR)
+            continue
+        target.write(marker + length_bytes)
+        copy(source, target, length)
+        if marker[1] == JPEG_SOS:
+            copy(source, target)
+            return
+
+
+def strip_png(source, target) -> None:
+    """Копирует PNG без текстовых чанков, EXIF и времени изменения."""
+    target.write(read_exactly(source, len(PNG_SIGNATURE)))
+    while True:
+        header = read_chunk_header(source)
+        if header is None:
+            return
+        length, chunk_type = struct.unpack('>I4s', header)
+        if chunk_type in PNG_METADATA_CHUNKS:
+            source.seek(length + 4, os.SEEK_CUR)
+            continue
+        target.write(header)
+        copy(source, target, length + 4)
+
+
+def strip_webp(source, target) -> None:
+    """Копирует WebP без чанков EXIF и XMP, исправляя флаги VP8X
+    и размер контейнера RIFF."""
+    target.write(read_exactly(source, 12))
+    while True:
+        header = read_chunk_header(source)
+        if header is None:
+            break
+        chunk_type, length = struct.unpack('<4sI', header)
+        padded = length + length % 2
+        if chunk_type in WEBP_METADATA_CHUNKS:
+            source.seek(padded, os.SEEK_CUR)
+            continue
+        target.write(header)
+        if chunk_type == b'VP8X':
+            flags = read_exactly(source, 1)[0] & ~WEBP_METADATA_FLAGS
+            target.write(bytes((flags,)))
+            padded -= 1
+        copy(source, target, padded)
+    size = target.tell()
+    target.seek(4)
+    target.write(struct.pack('<I', size - 8))
+    target.seek(size)
+
+
+def strip_metadata(file, image_format: str, orientation: int = None):
+    """Убирает метаданные изображения без перекодирования, чтобы
+    EXIF с координатами не раздавался и до перекодирования в пуле.
+    Возвращает новый временный файл."""
+    strippers = {
+        'JPEG': lambda source, target: strip_jpeg(
+            source, target, orientation),
+        'PNG': strip_png,
+        'WEBP': strip_webp,
+    }
+    if image_format not in strippers:
+        return file
+    output = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        with file:
+            file.seek(0)
+            strippers[image_format](file, output)
+    except (struct.error, ValidationError):
+        output.close()
+        raise ValidationError('Загрузите корректное изображение.')
+    output.seek(0)
+    return output
+
+
+def decode_data_uri(data: str) -> UploadedFile:
+    """Декодирует изображение из data URI во временный файл по частям.
+
+    Размер проверяется до декодирования, размеры в пикселях — по
+    заголовку файла, до распаковки самого изображения. Метаданные
+    удаляются сразу, до сохранения файла.
+    """
+    start = data.find(BASE64_MARKER)
+    if start == -1:
+        raise ValidationError('Изображение должно быть закодировано в base64.')
+    start += len(BASE64_MARKER)
+    if (len(data) - start) * 3 // 4 > IMAGE_MAX_SIZE:
+        raise ValidationError(
+            f'Размер изображения превышает {IMAGE_MAX_SIZE} байт.')
+    file = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        for position in range(start, len(data), DECODE_CHUNK_SIZE):
+            file.write(base64.b64decode(
+                data[position:position + DECODE_CHUNK_SIZE], validate=True))
+        size = file.tell()
+        file.seek(0)
+        with Image.open(file) as image:
+            image_format = image.format
+            width, height = image.size
+            # EXIF JPEG разбирается при открытии; у PNG чтение EXIF
+            # сдвинуло бы файл до verify.
+            orientation = (
+                image.getexif().get(EXIF_ORIENTATION_TAG)
+                if image_format == 'JPEG' else None)
+            image.verify()
+    except (binascii.Error, UnidentifiedImageError, OSError,
+            Image.DecompressionBombError):
+        file.close()
+        raise ValidationError('Загрузите корректное изображение.')
+    if image_format not in ALLOWED_FORMATS:
+        file.close()
+        raise ValidationError(
+            f'Формат {image_format} не поддерживается.')
+    if width * height > IMAGE_MAX_PIXELS:
+        file.close()
+        raise ValidationError(
+            f'Изображение больше {IMAGE_MAX_PIXELS} пикселей.')
+    file = strip_metadata(file, image_format, orientation)
+    size = file.seek(0, os.SEEK_END)
+    file.seek(0)
+    return UploadedFile(
+        file, name=f'image.{ALLOWED_FORMATS[image_format]}',
+        content_type=Image.MIME[image_format], size=size)
+
+
+def normalize(source) -> tuple:
+    """Перекодирует изображение с учетом поворота из EXIF: с прозрачностью
+    в PNG, остальные в JPEG. Возвращает временный файл и расширение."""
+    output = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+            image.convert('RGBA').save(output, 'PNG', optimize=True)
+            extension = 'png'
+        else:
+            image.convert('RGB').save(
+                output, 'JPEG', quality=JPEG_QUALITY, optimize=True,
+                progressive=True)
+            extension = 'jpg'
+    output.seek(0)
+    return output, extension
+
+
+def normalize_recipe_image(recipe_id: int, name: str) -> None:
+    """Заменяет загруженное изображение рецепта перекодированным.
+
+    Файлы хранятся по хэшу содержимого и могут быть общими для
+    нескольких рецептов, поэтому ставший лишним файл удаляется,
+    только если на него больше нет ссылок.
+    """
+    storage = Recipe._meta.get_field('image').storage
+    with storage.open(name) as source:
+        output, extension = normalize(source)
+    with output:
+        new_name = storage.save(
+            f'{os.path.dirname(name)}/image.{extension}', File(output))
+    if new_name == name:
+        return
+    updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image=new_name, updated_at=timezone.now())
+    if updated:
+        bump_version(Recipe)
+    unused = name if updated else new_name
+    if not Recipe.objects.filter(image=unused).exists():
+        storage.delete(unused)
+
+
+def run_normalize(recipe_id: int, name: str) -> None:
+    try:
+        normalize_recipe_image(recipe_id, name)
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', name)
+    finally:
+        slots.release()
+        close_old_connections()
+
+
+def schedule_normalize(recipe) -> None:
+    """Ставит перекодирование изображения рецепта в очередь пула
+    после фиксации транзакции. Если очередь заполнена, изображение
+    обрабатывается в текущем потоке."""
+    recipe_id, name = recipe.pk, recipe.image.name
+
+    def submit():
+        if slots.acquire(blocking=False):
+            executor.submit(run_normalize, recipe_id, name)
+        else:
+            normalize_recipe_image(recipe_id, name)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,234 @@
+import hashlib
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from foodgram.settings import (INGREDIENT_INDEX_TTL, INGREDIENT_SEARCH_LIMIT,
+                               RECIPE_INDEX_TTL)
+from recipes.models import Ingredient, IngredientRecipe
+from recipes.versions import get_label, get_versions
+
+RECIPE_INDEX_CHUNK_SIZE = 10000
+
+
+class IngredientIndex:
+    """Отсортированный индекс названий ингредиентов в памяти процесса.
+
+    Строится при первом обращении. Не чаще раза в INGREDIENT_INDEX_TTL
+    секунд индекс сверяет версию Ingredient и перестраивается, только
+    если она изменилась, в том числе после импорта в другом процессе.
+    Сигналы после фиксации транзакции заставляют сверить версию сразу.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._index: tuple = ([], [], '')
+        self._version = None
+        self._generation = 0
+        self._checked_generation = -1
+        self._checked_at = 0.0
+
+    def invalidate(self) -> None:
+        self._generation += 1
+
+    def _is_stale(self) -> bool:
+        return (self._checked_generation != self._generation
+                or time.monotonic() - self._checked_at > INGREDIENT_INDEX_TTL)
+
+    def _get_index(self) -> tuple:
+        if self._is_stale():
+            with self._lock:
+                if self._is_stale():
+                    generation = self._generation
+                    version = get_versions(Ingredient)[get_label(Ingredient)]
+                    if version != self._version:
+                        self._build(version)
+                    self._checked_generation = generation
+                    self._checked_at = time.monotonic()
+        return self._index
+
+    def _build(self, version: tuple) -> None:
+        rows = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda row: (row['name'].casefold(), row['measurement_unit'])
+        )
+        self._index = (
+            [row['name'].casefold() for row in rows],
+            rows,
+            hashlib.md5(repr(version).encode()).hexdigest()
+        )
+        self._version = version
+
+    @property
+    def checksum(self) -> str:
+        """Контрольная сумма версии Ingredient, по которой построен
+        индекс, для ETag."""
+        return self._get_index()[2]
+
+    def all(self) -> list:
+        """Возвращает все ингредиенты, отсортированные по названию."""
+        return self._get_index()[1]
+
+    def search(self, query: str, limit: int = INGREDIENT_SEARCH_LIMIT) -> list:
+        """Ищет ингредиенты: сначала совпадения по началу названия,
+        затем по вхождению подстроки."""
+        keys, rows, _ = self._get_index()
+        query = query.casefold()
+        start = bisect_left(keys, query)
+        stop = start
+        while stop < len(keys) and keys[stop].startswith(query):
+            stop += 1
+        result = rows[start:min(stop, start + limit)]
+        if len(result) < limit:
+            for key, row in zip(keys, rows):
+                if query in key and not key.startswith(query):
+                    result.append(row)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+def contains(ids: array, value: int) -> bool:
+    position = bisect_left(ids, value)
+    return position < len(ids) and ids[position] == value
+
+
+class RecipeIngredientIndex:
+    """Инвертированный индекс «ингредиент — рецепты» в памяти процесса.
+
+    Для каждого ингредиента хранится отсортированный массив id рецептов.
+    Рецепты, сохраненные в этом процессе, обновляются в индексе сразу
+    вместе с версией IngredientRecipe, которую получила их транзакция.
+    Не чаще раза в RECIPE_INDEX_TTL секунд индекс сверяет версию
+    и перестраивается, только если ее изменили другие процессы. Пока
+    один поток перестраивает индекс, остальные читают прежний.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._postings: dict = {}
+        self._version = None
+        self._generation = 0
+        self._checked_generation = -1
+        self._checked_at = 0.0
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version = None
+            self._generation += 1
+
+    def _is_stale(self) -> bool:
+        return (self._checked_generation != self._generation
+                or time.monotonic() - self._checked_at > RECIPE_INDEX_TTL)
+
+    def _get_postings(self) -> dict:
+        if self._is_stale() and self._build_lock.acquire(
+                blocking=self._version is None):
+            try:
+                if self._is_stale():
+                    self._refresh()
+            finally:
+                self._build_lock.release()
+        return self._postings
+
+    def _refresh(self) -> None:
+        """Сверяет версию IngredientRecipe и при ее изменении строит
+        новый индекс, не блокируя чтение текущего."""
+        generation = self._generation
+        version = get_versions(IngredientRecipe)[
+            get_label(IngredientRecipe)][0]
+        if version != self._version:
+            postings = self._build()
+            with self._lock:
+                # Пока индекс строился, его могли обновить записи этого
+                # процесса с более новой версией.
+                if self._version is None or self._version < version:
+                    self._postings, self._version = postings, version
+        self._checked_generation = generation
+        self._checked_at = time.monotonic()
+
+    @property
+    def version(self):
+        """Версия IngredientRecipe, по которой построен индекс."""
+        self._get_postings()
+        return self._version
+
+    def _build(self) -> dict:
+        postings = {}
+        for ingredient_id, recipe_id in IngredientRecipe.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id').iterator(
+                chunk_size=RECIPE_INDEX_CHUNK_SIZE):
+            ids = postings.get(ingredient_id)
+            if ids is None:
+                ids = postings[ingredient_id] = array('q')
+            if not ids or ids[-1] != recipe_id:
+                ids.append(recipe_id)
+        return postings
+
+    def update_recipe(self, recipe_id: int, ingredient_ids=(),
+                      version: int = None, changes: int = 1) -> None:
+        """Заменяет ингредиенты рецепта в индексе. Массивы не меняются
+        на месте, поэтому параллельные чтения видят целые массивы.
+
+        version — версия IngredientRecipe, полученная транзакцией
+        с этим изменением, changes — на сколько транзакция ее увеличила.
+        Индекс принимает версию, только если отставал ровно на changes;
+        иначе он пропустил чужие изменения и сверит версию при следующем
+        чтении.
+        """
+        with self._lock:
+            if self._version is None:
+                return
+            ingredient_ids = set(ingredient_ids)
+            postings = dict(self._postings)
+            for ingredient_id, ids in self._postings.items():
+                if (ingredient_id not in ingredient_ids
+                        and contains(ids, recipe_id)):
+                    position = bisect_left(ids, recipe_id)
+                    postings[ingredient_id] = (
+                        ids[:position] + ids[position + 1:])
+            for ingredient_id in ingredient_ids:
+                ids = postings.get(ingredient_id, array('q'))
+                if not contains(ids, recipe_id):
+                    position = bisect_left(ids, recipe_id)
+                    postings[ingredient_id] = (
+                        ids[:position] + array('q', (recipe_id,))
+                        + ids[position:])
+            self._postings = postings
+            if version is not None and version == self._version + changes:
+                self._version = version
+            else:
+                self._generation += 1
+
+    def remove_recipe(self, recipe_id: int, version: int = None,
+                      changes: int = 1) -> None:
+        self.update_recipe(recipe_id, (), version, changes)
+
+    def match(self, include, exclude=()) -> list:
+        """Возвращает отсортированные id рецептов, содержащих все
+        ингредиенты include и ни одного из exclude.
+
+        Проверяются только рецепты самого короткого массива, остальные
+        массивы просматриваются двоичным поиском.
+        """
+        postings = self._get_postings()
+        empty = array('q')
+        required = sorted(
+            (postings.get(ingredient_id, empty)
+             for ingredient_id in set(include)), key=len)
+        excluded = [postings[ingredient_id] for ingredient_id in set(exclude)
+                    if ingredient_id in postings]
+        if not required:
+            return []
+        return [
+            recipe_id for recipe_id in required[0]
+            if all(contains(ids, recipe_id) for ids in required[1:])
+            and not any(contains(ids, recipe_id) for ids in excluded)
+        ]
+
+
+ingredient_index = IngredientIndex()
+recipe_ingredient_index = RecipeIngredientIndex()
@@ -0,0 +1,107 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryMetrics:
+    """Собирает статистику SQL-запросов в рамках одного запроса к API."""
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.duration: float = 0.0
+        self.slowest_duration: float = 0.0
+        self.slowest_sql: str = ''
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if duration >= self.slowest_duration:
+                self.slowest_duration = duration
+                self.slowest_sql = sql
+
+
+# Сборщик текущего запроса: переменная контекста доступна и в потоках,
+# куда asgiref переносит выполнение представления.
+current_metrics: ContextVar = ContextVar('current_metrics', default=None)
+
+
+@contextmanager
+def collect_queries():
+    """Подключает сборщик текущего запроса к соединению с БД этого
+    потока. Нужен там, где представление выполняется не в потоке
+    middleware."""
+    metrics = current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    with connection.execute_wrapper(metrics):
+        yield
+
+
+class QueryMetricsMiddleware:
+    """Добавляет в ответ количество и время SQL-запросов.
+
+    Включается переменной окружения QUERY_METRICS_ENABLED.
+    Самый медленный запрос пишется в лог, если он дольше
+    QUERY_METRICS_SLOW_MS миллисекунд. У потоковых ответов запросы
+    считаются до конца чтения ответа и попадают только в лог.
+    """
+
+    def __init__(self, get_response) -> None:
+        if not settings.QUERY_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = QueryMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            with connection.execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response.streaming_content, metrics)
+            return response
+        response['X-DB-Queries'] = metrics.count
+        response['Server-Timing'] = (
+            f'db;dur={metrics.duration * 1000:.2f};'
+            f'desc="{metrics.count} queries", '
+            f'db-slowest;dur={metrics.slowest_duration * 1000:.2f}'
+        )
+        self.report(request, metrics)
+        return response
+
+    def stream(self, request, content, metrics: QueryMetrics):
+        """Считает запросы, выполняемые при чтении потокового ответа.
+        Заголовки к этому моменту уже отправлены, поэтому итоги
+        только пишутся в лог."""
+        try:
+            with connection.execute_wrapper(metrics):
+                yield from content
+        finally:
+            self.report(request, metrics)
+
+    @staticmethod
+    def report(request, metrics: QueryMetrics) -> None:
+        total_ms = metrics.duration * 1000
+        slowest_ms = metrics.slowest_duration * 1000
+        if slowest_ms >= settings.QUERY_METRICS_SLOW_MS:
+            logger.warning(
+                '%s %s: %d запросов, %.2f мс, самый медленный %.2f мс: %s',
+                request.method, request.path, metrics.count, total_ms,
+                slowest_ms, metrics.slowest_sql
+            )
@@ -1,9 +1,30 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 from foodgram.settings import PAGE_SIZE
 
+CURSOR_PAGINATION_FLAG = 'cursor'
+
+
+def is_cursor_requested(request) -> bool:
+    """Проверяет, запросил ли клиент курсорную пагинацию."""
+    return request.query_params.get('pagination') == CURSOR_PAGINATION_FLAG
+
 
 class CustomPagination(PageNumberPagination):
     """Кастомный класс пагинации."""
     page_size_query_param = 'limit'
     page_size = PAGE_SIZE
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсорная пагинация рецептов без подсчета общего количества."""
+    page_size_query_param = 'limit'
+    page_size = PAGE_SIZE
+    ordering = ('-pub_date', '-id')
+
+
+class SubscriptionCursorPagination(CursorPagination):
+    """Курсорная пагинация подписок по порядку их оформления."""
+    page_size_query_param = 'limit'
+    page_size = PAGE_SIZE
+    ordering = ('-subscription_id',)
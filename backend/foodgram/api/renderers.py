@@ -0,0 +1,132 @@
+import csv
+import io
+import json
+import logging
+import os
+from functools import lru_cache
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer
+
+from foodgram.settings import PDF_FONT_PATH
+from recipes.streams import Echo
+
+logger = logging.getLogger(__name__)
+
+TITLE = 'Ваш список покупок:'
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_FALLBACK_FONT = 'Helvetica'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+PDF_CHUNK_SIZE = 64 * 1024
+
+
+@lru_cache(maxsize=None)
+def get_pdf_font() -> str:
+    """Регистрирует шрифт с кириллицей один раз на процесс."""
+    if not os.path.exists(PDF_FONT_PATH):
+        logger.warning('Шрифт %s не найден, кириллица в PDF не будет '
+                       'отображаться.', PDF_FONT_PATH)
+        return PDF_FALLBACK_FONT
+    pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, PDF_FONT_PATH))
+    return PDF_FONT_NAME
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок, отдающий документ по частям.
+
+    Строки списка — кортежи (название, единица измерения, количество).
+    Ответы с ошибками приходят словарем и отдаются как JSON.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return json.dumps(data, ensure_ascii=False).encode()
+        return b''.join(
+            chunk if isinstance(chunk, bytes) else chunk.encode()
+            for chunk in self.stream(data)
+        )
+
+    def stream(self, rows):
+        raise NotImplementedError
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        yield f'{TITLE}\n\n'
+        for name, unit, amount in rows:
+            yield f'{name}, {unit}, {amount}\n'
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, rows):
+        separator = '['
+        for name, unit, amount in rows:
+            yield separator + json.dumps({
+                'name': name,
+                'measurement_unit': unit,
+                'amount': amount
+            }, ensure_ascii=False)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    """Собирает PDF целиком в памяти и отдает его частями.
+
+    reportlab не умеет выдавать страницы до завершения документа,
+    поэтому ответ буферизуется полностью. Его размер ограничен числом
+    различных ингредиентов, а не количеством рецептов в списке покупок.
+    """
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    def stream(self, rows):
+        font = get_pdf_font()
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        _, height = A4
+        line_height = PDF_FONT_SIZE * 1.5
+        y = height - PDF_MARGIN
+        pdf.setFont(font, PDF_FONT_SIZE + 4)
+        pdf.drawString(PDF_MARGIN, y, TITLE)
+        y -= line_height * 2
+        pdf.setFont(font, PDF_FONT_SIZE)
+        for name, unit, amount in rows:
+            if y < PDF_MARGIN:
+                pdf.showPage()
+                pdf.setFont(font, PDF_FONT_SIZE)
+                y = height - PDF_MARGIN
+            pdf.drawString(PDF_MARGIN, y, f'{name}, {unit}, {amount}')
+            y -= line_height
+        pdf.save()
+        buffer.seek(0)
+        while True:
+            chunk = buffer.read(PDF_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
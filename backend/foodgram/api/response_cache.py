@@ -0,0 +1,224 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+from foodgram.settings import (RECIPE_CACHE_ALIAS, RECIPE_CACHE_LRU_SIZE,
+                               RECIPE_CACHE_TTL, RECIPE_CARD_LRU_SIZE,
+                               RECIPE_CARD_TTL)
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from recipes.versions import get_label
+from users.models import User
+
+from .indexes import recipe_ingredient_index
+
+# Модели, от которых зависит список рецептов.
+RECIPE_LIST_MODELS = (Recipe, Tag, Ingredient, IngredientRecipe, User)
+# Справочники, от которых зависит карточка рецепта.
+RECIPE_CARD_MODELS = (Tag, Ingredient)
+# Параметры, порядок значений которых не влияет на ответ.
+UNORDERED_PARAMS = ('tags', 'author')
+# Параметры со списком id через запятую.
+ID_LIST_PARAMS = ('ingredients', 'exclude_ingredients')
+# Параметры, ответ на которые строится по индексу ингредиентов
+# в памяти процесса.
+INDEXED_PARAMS = ('ingredients',)
+# Ответы с этими параметрами не кэшируются: поисковые запросы редко
+# повторяются, а их ранжирование зависит от числа добавлений
+# в избранное, которое меняется без смены версий.
+UNCACHED_PARAMS = ('search',)
+
+
+class LRUCache:
+    """Потокобезопасный кэш в памяти процесса с вытеснением давно
+    не использовавшихся записей."""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key: str):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+class ResponseCache:
+    """Двухуровневый кэш данных ответов: LRU в памяти процесса
+    и общий кэш Django.
+
+    Ключ включает версии моделей, от которых зависит ответ. Сигналы
+    увеличивают версию при изменении модели, поэтому все старые ключи
+    сразу перестают использоваться, а записи вытесняются сами.
+    """
+
+    def __init__(self, prefix: str, models: tuple) -> None:
+        self.prefix = prefix
+        self.models = models
+        self.local = LRUCache(RECIPE_CACHE_LRU_SIZE)
+
+    @property
+    def shared(self):
+        return caches[RECIPE_CACHE_ALIAS]
+
+    @staticmethod
+    def is_cacheable(request) -> bool:
+        return request.user.is_anonymous and not any(
+            request.query_params.get(name) for name in UNCACHED_PARAMS)
+
+    def make_key(self, request, versions: dict) -> str:
+        """Собирает ключ из версий моделей, адреса сайта и нормализованных
+        параметров запроса."""
+        params = []
+        for name in sorted(request.query_params):
+            values = [
+                value for value in request.query_params.getlist(name)
+                if value
+            ]
+            if name in UNORDERED_PARAMS:
+                values.sort()
+            elif name in ID_LIST_PARAMS:
+                values = [
+                    ','.join(sorted(set(value.split(','))))
+                    for value in values
+                ]
+            if values:
+                params.append((name, values))
+        versions = sorted(
+            versions[get_label(model)] for model in self.models)
+        # Индекс процесса может отставать от версий моделей: без его
+        # версии в ключе устаревший ответ попал бы в общий кэш.
+        index_version = None
+        if any(request.query_params.get(name) for name in INDEXED_PARAMS):
+            index_version = recipe_ingredient_index.version
+        digest = hashlib.md5(repr((
+            versions, index_version, request.scheme, request.get_host(),
+            request.path, params)).encode()).hexdigest()
+        return f'{self.prefix}:{digest}'
+
+    def get(self, key: str):
+        data = self.local.get(key)
+        if data is None:
+            data = self.shared.get(key)
+            if data is not None:
+                self.local.set(key, data)
+        return data
+
+    def set(self, key: str, data) -> None:
+        self.local.set(key, data)
+        self.shared.set(key, data, RECIPE_CACHE_TTL)
+
+    def clear(self) -> None:
+        """Очищает только кэш процесса: общий кэш очищается сменой
+        версий."""
+        self.local.clear()
+
+
+def with_flags(card: dict, is_favorited: bool, is_in_shopping_cart: bool,
+               is_subscribed: bool) -> dict:
+    """Возвращает копию карточки рецепта с флагами пользователя."""
+    return {
+        **card,
+        'author': {**card['author'], 'is_subscribed': is_subscribed},
+        'is_favorited': is_favorited,
+        'is_in_shopping_cart': is_in_shopping_cart,
+    }
+
+
+class RecipeCardCache:
+    """Кэш карточек рецептов, общий для всех пользователей.
+
+    Карточка хранится без флагов пользователя и сбрасывается по дате
+    изменения рецепта, данным автора и версиям справочников. Дату
+    изменения обновляет и правка ингредиентов рецепта в обход него. Флаги
+    берутся из аннотаций рецептов страницы и подставляются при сборке
+    ответа, поэтому вошедшие пользователи используют те же карточки.
+    """
+
+    def __init__(self, prefix: str) -> None:
+        self.prefix = prefix
+        self.local = LRUCache(RECIPE_CARD_LRU_SIZE)
+
+    @property
+    def shared(self):
+        return caches[RECIPE_CACHE_ALIAS]
+
+    def make_key(self, recipe: Recipe, request, versions: dict) -> str:
+        author = recipe.author
+        digest = hashlib.md5(repr((
+            recipe.pk, recipe.updated_at, author.email, author.username,
+            author.first_name, author.last_name,
+            [versions[get_label(model)] for model in RECIPE_CARD_MODELS],
+            request.scheme, request.get_host())).encode()).hexdigest()
+        return f'{self.prefix}:{digest}'
+
+    def get_many(self, keys: list) -> dict:
+        cards = {}
+        for key in keys:
+            card = self.local.get(key)
+            if card is not None:
+                cards[key] = card
+        missing = [key for key in keys if key not in cards]
+        if missing:
+            for key, card in self.shared.get_many(missing).items():
+                self.local.set(key, card)
+                cards[key] = card
+        return cards
+
+    def set_many(self, cards: dict) -> None:
+        for key, card in cards.items():
+            self.local.set(key, card)
+        self.shared.set_many(cards, RECIPE_CARD_TTL)
+
+    def clear(self) -> None:
+        self.local.clear()
+
+    def get_cards(self, recipes: list, request, versions: dict,
+                  serialize) -> list:
+        """Собирает карточки рецептов страницы: недостающие в кэше
+        сериализует serialize одним вызовом на все рецепты.
+
+        Рецепты должны быть аннотированы флагами is_favorited,
+        is_in_shopping_cart и is_author_subscribed.
+        """
+        keys = [
+            self.make_key(recipe, request, versions) for recipe in recipes
+        ]
+        cards = self.get_many(keys)
+        missing = {
+            key: recipe for key, recipe in zip(keys, recipes)
+            if key not in cards
+        }
+        if missing:
+            created = {
+                key: with_flags(card, False, False, False)
+                for key, card in zip(
+                    missing, serialize(list(missing.values())))
+            }
+            self.set_many(created)
+            cards.update(created)
+        return [
+            with_flags(cards[key], recipe.is_favorited,
+                       recipe.is_in_shopping_cart,
+                       recipe.is_author_subscribed)
+            for key, recipe in zip(keys, recipes)
+        ]
+
+
+recipe_list_cache = ResponseCache('recipes', RECIPE_LIST_MODELS)
+recipe_card_cache = RecipeCardCache('recipe-card')
@@ -1,15 +1,22 @@
-import base64
 from typing import Any
 
-from django.core.files.base import ContentFile
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
 
-from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                            Shopping_cart, Tag)
+from foodgram.settings import BULK_MAX_IDS
+from recipes import feed, shopping_list
+from recipes.models import (Ingredient, IngredientRecipe, Recipe,
+                            ShoppingListItem, Tag)
+from recipes.rows import delete_rows
+from recipes.versions import bump_version
 from users.models import Subscription, User
 
+from . import images
+from .derivatives import get_derivative_urls
+from .fields import BulkPrimaryKeyRelatedField, BulkRelatedListSerializer
+from .indexes import recipe_ingredient_index
+
 
 class CustomUserCreateSerializer(UserCreateSerializer):
     """Сериализатор для создания объекта класса User."""
@@ -33,6 +40,8 @@ class CustomUserSerializer(UserSerializer):
     def get_is_subscribed(self, obj: Subscription) -> bool:
         """Функция для проверки подписки текущего
         пользователя на автора аккаунта."""
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request: Any | None = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -73,11 +82,12 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
 class IngredientRecipeAddSerializer(serializers.ModelSerializer):
     """Сериализатор для связи модели ингредиентов и рецептов."""
 
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = BulkPrimaryKeyRelatedField(queryset=Ingredient.objects.all())
 
     class Meta:
         model = IngredientRecipe
         fields = ('id', 'amount')
+        list_serializer_class = BulkRelatedListSerializer
 
 
 class Base64ImageField(serializers.ImageField):
@@ -85,9 +95,7 @@ class Base64ImageField(serializers.ImageField):
 
     def to_internal_value(self, data: str) -> str:
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            return images.decode_data_uri(data)
         return super().to_internal_value(data)
 
 
@@ -98,22 +106,44 @@ class RecipeSerializer(serializers.ModelSerializer):
     author = CustomUserSerializer(read_only=True)
     ingredients = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_variants = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_variants',
+                  'text', 'cooking_time')
+
+    def to_representation(self, recipe: Recipe) -> dict:
+        """Передает автору рецепта аннотированный флаг подписки."""
+        if hasattr(recipe, 'is_author_subscribed'):
+            recipe.author.is_subscribed = recipe.is_author_subscribed
+        return super().to_representation(recipe)
+
+    def get_image_variants(self, obj: Recipe) -> dict:
+        """Адреса уменьшенных копий изображения по вариантам и форматам."""
+        urls = get_derivative_urls(obj.image)
+        request = self.context.get('request')
+        if request is not None:
+            for formats in urls.values():
+                for extension, url in formats.items():
+                    formats[extension] = request.build_absolute_uri(url)
+        return urls
 
     def get_ingredients(self, obj: Recipe) -> dict:
         """Функция отображения ингредиентов в рецепте."""
-        ingredients = IngredientRecipe.objects.filter(recipe=obj)
+        ingredients = obj.ingredientrecipe_set.all()
+        if 'ingredientrecipe_set' not in getattr(
+                obj, '_prefetched_objects_cache', {}):
+            ingredients = ingredients.select_related('ingredient')
         return IngredientRecipeSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj: Recipe) -> bool:
         """Проверяет, добавил ли текущий пользователь рецепт в избанное."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request: Any | None = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -122,6 +152,8 @@ class RecipeSerializer(serializers.ModelSerializer):
     def get_is_in_shopping_cart(self, obj: Recipe) -> bool:
         """Проверяет, добавил ли текущий пользователь
         рецепт в список покупок."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request: Any | None = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -133,7 +165,7 @@ class RecipeCreateSerializer(RecipeSerializer):
 
     author = CustomUserSerializer(read_only=True)
     image = Base64ImageField()
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True)
     ingredients = IngredientRecipeAddSerializer(many=True)
 
@@ -145,17 +177,18 @@ class RecipeCreateSerializer(RecipeSerializer):
 
     def validate(self, data: dict) -> dict:
         """Проверяем, что рецепт содержит уникальные ингредиенты
-        и их количество не меньше 1."""
-        if not data.get('ingredients'):
+        и их количество не меньше 1. При частичном обновлении
+        проверяются только переданные поля."""
+        if (not self.partial or 'ingredients' in data) and not data.get(
+                'ingredients'):
             raise serializers.ValidationError(
                 'Нужно добавить хотя бы 1 ингредиент!')
-        if not data.get('tags'):
+        if (not self.partial or 'tags' in data) and not data.get('tags'):
             raise serializers.ValidationError(
                 'Нужно добавить хотя бы 1 тег!')
-        ingredients: list = self.initial_data.get('ingredients')
         ingredient_list: list = []
-        for ingredient in ingredients:
-            if int(ingredient['amount']) <= 0:
+        for ingredient in data.get('ingredients', ()):
+            if ingredient['amount'] <= 0:
                 raise serializers.ValidationError(
                     'Количество ингредиента не может быть меньше 1.')
             ingredient_list.append(ingredient['id'])
@@ -188,6 +221,20 @@ class RecipeCreateSerializer(RecipeSerializer):
             )
         IngredientRecipe.objects.bulk_create(ingredients_list)
 
+    @staticmethod
+    def schedule_index_update(recipe, ingredients):
+        """Отмечает изменение ингредиентов рецептов и обновляет рецепт
+        в индексе ингредиентов после фиксации транзакции. Массовые
+        вставки не отправляют сигналы, поэтому версия меняется здесь:
+        по ней индекс перестраивается в других процессах, а этот процесс
+        получает ее вместе с изменением и не перестраивает индекс."""
+        version = bump_version(IngredientRecipe)
+        recipe_id = recipe.pk
+        ingredient_ids = [ingredient['id'].pk for ingredient in ingredients]
+        transaction.on_commit(lambda: recipe_ingredient_index.update_recipe(
+            recipe_id, ingredient_ids, version))
+
+    @transaction.atomic
     def create(self, validated_data: dict) -> Recipe:
         """Функция для создания рецепта."""
         author: Any = self.context.get('request').user
@@ -196,23 +243,83 @@ class RecipeCreateSerializer(RecipeSerializer):
         recipe: Recipe = Recipe.objects.create(author=author, **validated_data)
         recipe.tags.add(*tags)
         self.add_ingredient(ingredients, recipe)
+        self.schedule_index_update(recipe, ingredients)
+        feed.fan_out(recipe)
+        images.schedule_normalize(recipe)
         return recipe
 
+    @staticmethod
+    def update_tags(recipe: Recipe, tags: list) -> None:
+        """Добавляет новые теги рецепта и удаляет убранные,
+        не трогая остальные."""
+        recipe_tag = Recipe.tags.through
+        old_ids = set(recipe_tag.objects.filter(
+            recipe=recipe).values_list('tag_id', flat=True))
+        new_ids = {tag.pk for tag in tags}
+        if old_ids - new_ids:
+            recipe_tag.objects.filter(
+                recipe=recipe, tag_id__in=old_ids - new_ids).delete()
+        recipe_tag.objects.bulk_create(
+            recipe_tag(recipe=recipe, tag_id=tag_id)
+            for tag_id in new_ids - old_ids)
+
+    @staticmethod
+    def update_ingredients(recipe: Recipe, ingredients: list) -> dict:
+        """Применяет к ингредиентам рецепта только изменения: удаляет
+        убранные, обновляет изменившиеся количества одним запросом
+        и добавляет новые. Возвращает прежние количества."""
+        rows = {
+            row.ingredient_id: row
+            for row in IngredientRecipe.objects.filter(recipe=recipe)
+        }
+        old_amounts = {
+            ingredient_id: row.amount for ingredient_id, row in rows.items()}
+        new_amounts = {
+            ingredient['id'].pk: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = rows.keys() - new_amounts.keys()
+        if removed:
+            # Без сигналов post_delete: списки покупок обновляет
+            # update сразу для всех изменений.
+            delete_rows(IngredientRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed))
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            row = rows.get(ingredient_id)
+            if row is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in rows
+        )
+        return old_amounts
+
+    @transaction.atomic
     def update(self, instance: Recipe, validated_data: dict) -> Recipe:
-        """Функция для изменения рецепта."""
-        recipe = instance
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
-        instance.image = validated_data.get('image', instance.image)
-        instance.cooking_time = validated_data.get(
-            'cooking_time', instance.cooking_time)
-        tags = validated_data.get('tags')
-        instance.tags.clear()
-        instance.tags.add(*tags)
-        ingredients = validated_data.get('ingredients')
-        instance.ingredients.clear()
-        self.add_ingredient(ingredients, recipe)
-        instance.save()
+        """Функция для изменения рецепта. Меняются только переданные
+        поля, теги и ингредиенты обновляются по разнице с текущими."""
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        if tags is not None:
+            self.update_tags(instance, tags)
+        if ingredients is not None:
+            old_amounts = self.update_ingredients(instance, ingredients)
+            self.schedule_index_update(instance, ingredients)
+            shopping_list.change_recipe(instance, old_amounts, {
+                ingredient['id'].pk: ingredient['amount']
+                for ingredient in ingredients
+            })
+        instance.save(update_fields=(*validated_data, 'updated_at'))
+        if 'image' in validated_data:
+            images.schedule_normalize(instance)
         return instance
 
     def to_representation(self, recipe: Recipe) -> dict:
@@ -230,30 +337,23 @@ class RecipeMiniSerializer(RecipeSerializer):
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         )
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
-    """Сериализатор для модели Subscription."""
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    """Сериализатор позиции списка покупок."""
 
-    class Meta:
-        model = Subscription
-        fields = '__all__'
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Subscription.objects.all(),
-                fields=('author', 'subscriber'),
-                message='Вы уже подписались на этого автора'
-            )
-        ]
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
+    amount = serializers.ReadOnlyField(source='total_amount')
 
-    def validate(self, data: dict) -> dict:
-        """Проверяем, что пользователь не подписывается на самого себя."""
-        if data['subscriber'] == data['author']:
-            raise serializers.ValidationError(
-                'Ты, конечно, супер, но дай другим подписаться на тебя!')
-        return data
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
 class SubscriptionShowSerializer(CustomUserSerializer):
@@ -277,6 +377,10 @@ class SubscriptionShowSerializer(CustomUserSerializer):
 
     def get_recipes(self, obj):
         request = self.context.get('request')
+        if hasattr(obj, 'recent_recipes'):
+            return RecipeMiniSerializer(
+                obj.recent_recipes, many=True,
+                context={'request': request}).data
         recipes = Recipe.objects.filter(author=obj)
         limit = request.query_params.get('recipes_limit')
         if limit:
@@ -285,34 +389,12 @@ class SubscriptionShowSerializer(CustomUserSerializer):
             recipes, many=True, context={'request': request}).data
 
     def get_recipes_count(self, object: User) -> int:
-        return object.recipes.count()
+        return object.recipes_count
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
-    """Сериализатор для модели Favorite."""
+class BulkIdsSerializer(serializers.Serializer):
+    """Список id для массового добавления или удаления."""
 
-    class Meta:
-        model = Favorite
-        fields = '__all__'
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Favorite.objects.all(),
-                fields=('user', 'recipe'),
-                message='Этот рецепт уже в вашем списке избранного!'
-            )
-        ]
-
-
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    """Сериализатор для модели Shopping_Cart."""
-
-    class Meta:
-        model = Shopping_cart
-        fields = '__all__'
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Shopping_cart.objects.all(),
-                fields=('user', 'recipe'),
-                message='Этот рецепт уже в вашем списке покупок!'
-            )
-        ]
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=BULK_MAX_IDS)
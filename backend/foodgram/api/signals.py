@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes.models import Ingredient, IngredientRecipe, Recipe
+from recipes.versions import get_label, get_versions
+
+from .indexes import ingredient_index, recipe_ingredient_index
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs) -> None:
+    """Сбрасывает индекс поиска ингредиентов после фиксации изменения,
+    когда новая версия Ingredient уже видна."""
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver(pre_delete, sender=Recipe)
+def count_recipe_ingredients(instance, **kwargs) -> None:
+    """Запоминает число ингредиентов удаляемого рецепта: на столько
+    каскадное удаление увеличит версию IngredientRecipe."""
+    instance.ingredients_count = IngredientRecipe.objects.filter(
+        recipe=instance).count()
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_recipe_index(instance, **kwargs) -> None:
+    """Убирает удаленный рецепт из индекса ингредиентов после фиксации
+    удаления вместе с версией IngredientRecipe, которую получила
+    транзакция."""
+    recipe_id = instance.pk
+    changes = getattr(instance, 'ingredients_count', 0)
+    version = get_versions(IngredientRecipe)[get_label(IngredientRecipe)][0]
+    transaction.on_commit(lambda: recipe_ingredient_index.remove_recipe(
+        recipe_id, version, changes))
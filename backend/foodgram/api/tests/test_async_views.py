@@ -0,0 +1,30 @@
+from asgiref.sync import async_to_sync
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from api.async_views import async_read_view
+from api.middleware import QueryMetricsMiddleware
+from api.views import TagViewSet
+from recipes.models import Tag
+
+
+class AsyncReadViewTest(TransactionTestCase):
+    """Проверяет, что асинхронная обертка отдает тот же ответ."""
+
+    def test_read(self):
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+        view = TagViewSet.as_view({'get': 'list'})
+        request = APIRequestFactory().get('/api/tags/')
+        response = async_to_sync(async_read_view(view))(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, view(request).render().content)
+
+    @override_settings(QUERY_METRICS_ENABLED=True)
+    def test_metrics(self):
+        """Запросы представления в пуле потоков попадают в метрики."""
+        view = async_to_sync(async_read_view(
+            TagViewSet.as_view({'get': 'list'})))
+        response = QueryMetricsMiddleware(view)(
+            APIRequestFactory().get('/api/tags/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-DB-Queries']), 0)
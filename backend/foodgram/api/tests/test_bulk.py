@@ -0,0 +1,109 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from api.utils import insert_rows
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            Shopping_cart, ShoppingListItem)
+from users.models import Subscription, User
+
+
+class BulkTest(APITestCase):
+    """Проверяет массовое добавление и удаление связей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Автор', password='pass')
+        cls.reader = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Читатель', last_name='Читатель', password='pass')
+        cls.flour = Ingredient.objects.create(
+            name='Мука', measurement_unit='г')
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=10, image='recipes/test.png')
+            for number in range(3)
+        ]
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=recipe, ingredient=cls.flour, amount=100)
+            for recipe in cls.recipes)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def request(self, method: str, url: str, ids: list) -> dict:
+        response = getattr(self.client, method)(
+            url, {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {
+            result['id']: result['status']
+            for result in response.data['results']
+        }
+
+    def test_favorites(self):
+        first, second, _ = self.recipes
+        Favorite.objects.create(user=self.reader, recipe=first)
+        url = '/api/recipes/favorite/'
+        # Проверка, вставка и счетчики; еще два запроса — точка
+        # сохранения транзакции.
+        with self.assertNumQueries(5):
+            results = self.request('post', url, [first.id, second.id, 999])
+        self.assertEqual(results, {
+            first.id: 'exists', second.id: 'created', 999: 'not_found'})
+        second.refresh_from_db()
+        self.assertEqual(second.favorites_count, 1)
+        results = self.request('delete', url, [first.id, second.id, 999])
+        self.assertEqual(results, {
+            first.id: 'deleted', second.id: 'deleted', 999: 'missing'})
+        self.assertFalse(Favorite.objects.exists())
+        second.refresh_from_db()
+        self.assertEqual(second.favorites_count, 0)
+
+    def test_insert_rows(self):
+        """Возвращаются только вставленные строки, вставка идет
+        по возрастанию id."""
+        first, second, third = self.recipes
+        Favorite.objects.create(user=self.reader, recipe=first)
+        with CaptureQueriesContext(connection) as context:
+            inserted = insert_rows(
+                Favorite, 'user_id', 'recipe_id', self.reader.pk,
+                [third.id, first.id, second.id])
+        self.assertEqual(inserted, {second.id, third.id})
+        if not connection.features.can_return_rows_from_bulk_insert:
+            self.assertEqual(
+                [query['sql'].rsplit(', ', 1)[-1]
+                 for query in context.captured_queries],
+                [str(recipe.id) for recipe in self.recipes])
+
+    def test_shopping_cart(self):
+        ids = [recipe.id for recipe in self.recipes]
+        url = '/api/recipes/shopping_cart/'
+        self.request('post', url, ids)
+        self.assertEqual(Shopping_cart.objects.count(), 3)
+        self.assertEqual(
+            ShoppingListItem.objects.get(user=self.reader).total_amount, 300)
+        self.request('delete', url, ids[:2])
+        self.assertEqual(
+            ShoppingListItem.objects.get(user=self.reader).total_amount, 100)
+
+    def test_subscriptions(self):
+        url = '/api/users/subscribe/'
+        results = self.request('post', url, [self.author.id, self.reader.id])
+        self.assertEqual(results, {
+            self.author.id: 'created', self.reader.id: 'self_subscription'})
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 1)
+        self.assertEqual(self.reader.feed.count(), 3)
+        self.request('delete', url, [self.author.id])
+        self.assertFalse(Subscription.objects.exists())
+        self.assertFalse(self.reader.feed.exists())
+
+    def test_invalid_payload(self):
+        response = self.client.post(
+            '/api/recipes/favorite/', {'ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,75 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.forms import modelform_factory
+from rest_framework.test import APITestCase
+
+from recipes.models import Favorite, Recipe
+from users.models import Subscription, User
+
+
+class CountersTest(APITestCase):
+    """Проверяет поддержку денормализованных счетчиков."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Автор', password='pass')
+        cls.reader = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Читатель', last_name='Читатель', password='pass')
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Текст',
+            cooking_time=10, image='recipes/test.png')
+
+    def test_full_save_keeps_counters(self):
+        """Сохранение ранее загруженного объекта не затирает счетчики,
+        измененные за это время."""
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        author = User.objects.get(pk=self.author.pk)
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        Subscription.objects.create(subscriber=self.reader, author=self.author)
+        recipe.name = 'Новое название'
+        recipe.save()
+        author.set_password('new-pass')
+        author.save()
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'Новое название')
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.author.subscribers_count, 1)
+        self.assertTrue(self.author.check_password('new-pass'))
+
+    def test_admin_forms_exclude_counters(self):
+        for model, fields in ((Recipe, Recipe.counter_fields),
+                              (User, User.counter_fields)):
+            form = modelform_factory(model, fields='__all__')
+            self.assertFalse(set(fields) & set(form.base_fields))
+
+    def test_signals(self):
+        favorite = Favorite.objects.create(
+            user=self.reader, recipe=self.recipe)
+        subscription = Subscription.objects.create(
+            subscriber=self.reader, author=self.author)
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.author.recipes_count, 1)
+        self.assertEqual(self.author.subscribers_count, 1)
+        favorite.delete()
+        subscription.delete()
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+        self.assertEqual(self.author.subscribers_count, 0)
+
+    def test_reconcile(self):
+        Favorite.objects.bulk_create(
+            [Favorite(user=self.reader, recipe=self.recipe)])
+        User.objects.filter(pk=self.author.pk).update(recipes_count=5)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.author.recipes_count, 1)
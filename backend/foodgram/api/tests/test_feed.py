@@ -0,0 +1,64 @@
+from unittest import mock
+
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from recipes import feed
+from recipes.models import FeedItem, Recipe
+from users.models import User
+
+
+class FeedTest(APITestCase):
+    """Проверяет ленту рецептов авторов из подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Читатель', last_name='Читатель', password='pass')
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Автор', password='pass')
+        cls.old_recipe = cls.create_recipe('Старый рецепт')
+
+    @classmethod
+    def create_recipe(cls, name: str) -> Recipe:
+        recipe = Recipe.objects.create(
+            author=cls.author, name=name, text='Текст', cooking_time=10,
+            image='recipes/test.png')
+        cls.author.refresh_from_db()
+        feed.fan_out(recipe)
+        return recipe
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def get_feed_ids(self) -> list:
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def subscribe(self, method: str) -> None:
+        getattr(self.client, method)(
+            f'/api/users/{self.author.id}/subscribe/')
+        self.author.refresh_from_db()
+
+    def test_fan_out_on_write(self):
+        self.assertEqual(self.get_feed_ids(), [])
+        self.subscribe('post')
+        self.assertEqual(self.get_feed_ids(), [self.old_recipe.id])
+        new_recipe = self.create_recipe('Новый рецепт')
+        self.assertEqual(
+            self.get_feed_ids(), [new_recipe.id, self.old_recipe.id])
+        self.subscribe('delete')
+        self.assertEqual(self.get_feed_ids(), [])
+        self.assertFalse(FeedItem.objects.exists())
+
+    @mock.patch.object(feed, 'FEED_FANOUT_THRESHOLD', 0)
+    def test_fan_out_on_read(self):
+        self.subscribe('post')
+        new_recipe = self.create_recipe('Новый рецепт')
+        self.assertFalse(FeedItem.objects.exists())
+        self.assertEqual(
+            self.get_feed_ids(), [new_recipe.id, self.old_recipe.id])
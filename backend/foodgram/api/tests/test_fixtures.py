@@ -0,0 +1,22 @@
+from io import StringIO
+
+from django.core.management import call_command
+from rest_framework.test import APITestCase
+
+from recipes.models import Favorite, Ingredient
+
+
+class GenerateFixturesTest(APITestCase):
+    """Проверяет отчет команды generate_fixtures."""
+
+    def test_reports_created_pairs(self):
+        Ingredient.objects.create(name='Рис', measurement_unit='г')
+        output = StringIO()
+        call_command(
+            'generate_fixtures', users=5, recipes=5, favorites=50, carts=5,
+            subscriptions=5, batch_size=20, stdout=output)
+        report = [line for line in output.getvalue().splitlines()
+                  if line.startswith('Избранное')]
+        self.assertTrue(report[-1].startswith(
+            f'Избранное: {Favorite.objects.count()} '))
+        self.assertLess(Favorite.objects.count(), 50)
@@ -0,0 +1,134 @@
+import base64
+import io
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from PIL import Image, ImageOps, PngImagePlugin
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase
+
+from api import images
+from recipes.models import Recipe
+from users.models import User
+
+EXIF_MODEL_TAG = 0x0110
+EXIF_ORIENTATION_TAG = 0x0112
+
+
+def make_image(image_format='JPEG', size=(40, 30), orientation=1,
+               **params) -> bytes:
+    exif = Image.Exif()
+    exif[EXIF_MODEL_TAG] = 'Camera'
+    exif[EXIF_ORIENTATION_TAG] = orientation
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(
+        buffer, image_format, exif=exif, **params)
+    return buffer.getvalue()
+
+
+def make_jpeg(size=(40, 30)) -> bytes:
+    return make_image(size=size)
+
+
+def make_data_uri(content: bytes) -> str:
+    return 'data:image/jpeg;base64,' + base64.b64encode(content).decode()
+
+
+class ImageUploadTest(APITestCase):
+    """Проверяет декодирование и перекодирование изображений рецептов."""
+
+    def test_decode(self):
+        content = make_image(comment=b'comment')
+        with mock.patch.object(images, 'DECODE_CHUNK_SIZE', 8):
+            upload = images.decode_data_uri(make_data_uri(content))
+        self.assertEqual(upload.name, 'image.jpg')
+        data = upload.read()
+        self.assertEqual(upload.size, len(data))
+        self.assertNotIn(b'Camera', data)
+        self.assertNotIn(b'comment', data)
+        with Image.open(io.BytesIO(data)) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(len(image.getexif()), 0)
+            image.load()
+
+    def test_decode_keeps_orientation(self):
+        content = make_image(orientation=6)
+        upload = images.decode_data_uri(make_data_uri(content))
+        data = upload.read()
+        self.assertNotIn(b'Camera', data)
+        with Image.open(io.BytesIO(data)) as image:
+            self.assertEqual(dict(image.getexif()), {EXIF_ORIENTATION_TAG: 6})
+            self.assertEqual(ImageOps.exif_transpose(image).size, (30, 40))
+
+    def test_decode_strips_png_and_webp(self):
+        text = PngImagePlugin.PngInfo()
+        text.add_text('Location', 'Camera')
+        for image_format, params in (('PNG', {'pnginfo': text}),
+                                     ('WEBP', {})):
+            with self.subTest(image_format=image_format):
+                content = make_image(image_format, **params)
+                self.assertIn(b'Camera', content)
+                upload = images.decode_data_uri(make_data_uri(content))
+                data = upload.read()
+                self.assertNotIn(b'Camera', data)
+                with Image.open(io.BytesIO(data)) as image:
+                    self.assertEqual(image.format, image_format)
+                    self.assertEqual(image.size, (40, 30))
+                    image.load()
+
+    def test_limits(self):
+        data_uri = make_data_uri(make_jpeg())
+        with mock.patch.object(images, 'IMAGE_MAX_SIZE', 10):
+            self.assertRaises(
+                ValidationError, images.decode_data_uri, data_uri)
+        with mock.patch.object(images, 'IMAGE_MAX_PIXELS', 100):
+            self.assertRaises(
+                ValidationError, images.decode_data_uri, data_uri)
+        self.assertRaises(
+            ValidationError, images.decode_data_uri,
+            'data:image/png;base64,bm90IGFuIGltYWdl')
+
+    def test_normalize_recipe_image(self):
+        author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Автор', password='pass')
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            recipe = Recipe.objects.create(
+                author=author, name='Рецепт', text='Текст', cooking_time=10,
+                image=ContentFile(make_jpeg(), name='temp.jpg'))
+            original = recipe.image.name
+            images.normalize_recipe_image(recipe.pk, original)
+            recipe.refresh_from_db()
+            self.assertNotEqual(recipe.image.name, original)
+            self.assertFalse(recipe.image.storage.exists(original))
+            with Image.open(recipe.image.path) as image:
+                self.assertEqual(image.format, 'JPEG')
+                self.assertNotIn(EXIF_MODEL_TAG, image.getexif())
+
+
+class ImageDerivativeTest(APITestCase):
+    """Проверяет создание уменьшенных копий изображений по запросу."""
+
+    def test_derivative(self):
+        author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Автор', password='pass')
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            recipe = Recipe.objects.create(
+                author=author, name='Рецепт', text='Текст', cooking_time=10,
+                image=ContentFile(make_jpeg((1000, 500)), name='temp.jpg'))
+            response = self.client.get(f'/api/recipes/{recipe.id}/')
+            url = response.data['image_variants']['thumb']['webp']
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('immutable', response['Cache-Control'])
+            with Image.open(io.BytesIO(b''.join(response.streaming_content))
+                            ) as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertEqual(image.size, (160, 80))
+            missing = url.replace(recipe.image.name, 'recipes/missing.jpg')
+            self.assertEqual(self.client.get(missing).status_code, 404)
@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.test import TestCase
+
+from recipes import importer
+from recipes.models import Ingredient, Tag
+
+
+class CatalogImportTest(TestCase):
+    """Проверяет повторяемый импорт справочников."""
+
+    def write(self, name: str, content: str) -> str:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_csv(self):
+        path = self.write(
+            'ingredients.csv', 'абрикос,г\nбанан,шт\nабрикос,г\n')
+        self.assertEqual(
+            importer.import_catalog('ingredients', path, 'csv', 2), (2, 0, 1))
+        self.assertIsNone(
+            importer.import_catalog('ingredients', path, 'csv', 2))
+        self.assertEqual(
+            importer.import_catalog(
+                'ingredients', path, 'csv', 2, force=True), (0, 0, 3))
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_json(self):
+        tags = [
+            {'name': f'Тег {i}', 'color': f'#00000{i}', 'slug': f'tag{i}'}
+            for i in range(5)
+        ]
+        path = self.write('tags.json', json.dumps(tags, indent=2))
+        with mock.patch.object(importer, 'READ_CHUNK_SIZE', 7):
+            self.assertEqual(
+                importer.import_catalog('tags', path, 'json', 2), (5, 0, 0))
+            tags[0]['name'] = 'Завтрак'
+            path = self.write('tags.json', json.dumps(tags))
+            self.assertEqual(
+                importer.import_catalog('tags', path, 'json', 2), (0, 1, 4))
+        self.assertEqual(Tag.objects.get(slug='tag0').name, 'Завтрак')
+
+    def test_unique_fields_outside_key(self):
+        Tag.objects.create(name='Завтрак', color='#000001', slug='breakfast')
+        tags = [
+            {'name': 'Завтрак', 'color': '#000002', 'slug': 'morning'},
+            {'name': 'Обед', 'color': '#000001', 'slug': 'lunch'},
+            {'name': 'Ужин', 'color': '#000003', 'slug': 'dinner'},
+            {'name': 'Ужин', 'color': '#000004', 'slug': 'supper'},
+            {'name': 'Десерт', 'color': '#000005', 'slug': 'breakfast'},
+        ]
+        path = self.write('tags.json', json.dumps(tags))
+        self.assertEqual(
+            importer.import_catalog('tags', path, 'json', 2), (1, 1, 3))
+        self.assertEqual(
+            dict(Tag.objects.values_list('slug', 'name')),
+            {'breakfast': 'Десерт', 'dinner': 'Ужин'})
+
+    def test_invalid(self):
+        for name, content in (('tags.json', '{"name": "Тег"}'),
+                              ('tags.json', '[{"name": "Тег"}]'),
+                              ('tags.json', '[{"name": "Тег",'),
+                              ('tags.csv', 'Тег,#000000\n')):
+            path = self.write(name, content)
+            with self.assertRaises(importer.ImportDataError):
+                importer.import_catalog(
+                    'tags', path, name.rpartition('.')[-1], 10)
@@ -0,0 +1,159 @@
+from unittest import mock
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api import filters, indexes
+from api.indexes import RecipeIngredientIndex, recipe_ingredient_index
+from api.response_cache import recipe_list_cache
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from recipes.versions import bump_version
+from users.models import User
+
+
+class IngredientFilterTest(APITestCase):
+    """Проверяет фильтрацию рецептов по ингредиентам через индекс."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Автор', password='pass')
+        cls.dinner = Tag.objects.create(
+            name='Ужин', color='#FF0000', slug='dinner')
+        cls.chicken, cls.rice, cls.milk = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Курица', 'Рис', 'Молоко'))
+        cls.pilaf = cls.create_recipe(
+            'Плов', 60, cls.chicken, cls.rice)
+        cls.porridge = cls.create_recipe(
+            'Каша', 20, cls.rice, cls.milk)
+        cls.casserole = cls.create_recipe(
+            'Запеканка', 40, cls.chicken, cls.rice, cls.milk)
+        cls.pilaf.tags.add(cls.dinner)
+
+    @classmethod
+    def create_recipe(cls, name: str, cooking_time: int,
+                      *ingredients) -> Recipe:
+        recipe = Recipe.objects.create(
+            author=cls.author, name=name, text='Текст',
+            cooking_time=cooking_time, image='recipes/test.png')
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in ingredients)
+        return recipe
+
+    def setUp(self):
+        recipe_ingredient_index.invalidate()
+        self.clear_cache()
+
+    @staticmethod
+    def clear_cache() -> None:
+        """Тесты меняют индекс в обход базы, поэтому версии моделей
+        не меняются и кэш списка рецептов нужно очищать."""
+        recipe_list_cache.clear()
+        cache.clear()
+
+    def get_ids(self, **params) -> set:
+        response = self.client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {recipe['id'] for recipe in response.data['results']}
+
+    def test_include_and_exclude(self):
+        self.assertEqual(
+            self.get_ids(ingredients=f'{self.chicken.id},{self.rice.id}'),
+            {self.pilaf.id, self.casserole.id})
+        self.assertEqual(
+            self.get_ids(ingredients=f'{self.rice.id}',
+                         exclude_ingredients=f'{self.milk.id}'),
+            {self.pilaf.id})
+        self.assertEqual(
+            self.get_ids(exclude_ingredients=f'{self.chicken.id}'),
+            {self.porridge.id})
+
+    @mock.patch.object(filters, 'RECIPE_INDEX_MAX_IDS', 0)
+    def test_many_matches_use_subqueries(self):
+        self.test_include_and_exclude()
+        with mock.patch.object(RecipeIngredientIndex, 'match') as match:
+            match.return_value = [self.pilaf.id]
+            self.assertEqual(
+                self.get_ids(ingredients=f'{self.rice.id}',
+                             exclude_ingredients=f'{self.milk.id}'),
+                {self.pilaf.id})
+
+    def test_combined_with_other_filters(self):
+        rice = f'{self.rice.id}'
+        self.assertEqual(
+            self.get_ids(ingredients=rice, max_cooking_time=40),
+            {self.porridge.id, self.casserole.id})
+        self.assertEqual(
+            self.get_ids(ingredients=rice, tags='dinner'), {self.pilaf.id})
+
+    def test_index_update(self):
+        chicken = f'{self.chicken.id}'
+        self.assertEqual(
+            self.get_ids(ingredients=chicken),
+            {self.pilaf.id, self.casserole.id})
+        recipe_ingredient_index.update_recipe(
+            self.porridge.id, (self.chicken.id,))
+        recipe_ingredient_index.update_recipe(self.casserole.id, ())
+        self.clear_cache()
+        self.assertEqual(
+            self.get_ids(ingredients=chicken),
+            {self.pilaf.id, self.porridge.id})
+        self.assertEqual(
+            recipe_ingredient_index.match((self.milk.id,)), [])
+
+    def test_api_update_without_rebuild(self):
+        """Изменение и удаление рецепта через API попадают в индекс
+        вместе с новой версией после фиксации транзакции: даже при
+        сверке версии на каждом чтении индекс не перестраивается."""
+        chicken = f'{self.chicken.id}'
+        self.get_ids(ingredients=chicken)
+        self.client.force_authenticate(self.author)
+        with mock.patch.object(indexes, 'RECIPE_INDEX_TTL', -1), \
+                mock.patch.object(RecipeIngredientIndex, '_build') as build:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(
+                    f'/api/recipes/{self.porridge.id}/',
+                    {'ingredients': [{'id': self.chicken.id, 'amount': 1}]},
+                    format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                self.get_ids(ingredients=chicken),
+                {self.pilaf.id, self.porridge.id, self.casserole.id})
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete(
+                    f'/api/recipes/{self.casserole.id}/')
+            self.assertEqual(
+                response.status_code, status.HTTP_204_NO_CONTENT)
+            self.assertEqual(
+                self.get_ids(ingredients=chicken),
+                {self.pilaf.id, self.porridge.id})
+        build.assert_not_called()
+
+    def test_rebuild_after_missed_version(self):
+        """Если версию успел изменить другой процесс, локальное изменение
+        не скрывает пропуск и индекс перестраивается."""
+        self.get_ids(ingredients=f'{self.chicken.id}')
+        bump_version(IngredientRecipe)
+        version = bump_version(IngredientRecipe)
+        recipe_ingredient_index.update_recipe(
+            self.porridge.id, (self.chicken.id,), version)
+        with mock.patch.object(
+                RecipeIngredientIndex, '_build', return_value={}) as build:
+            recipe_ingredient_index.match((self.chicken.id,))
+        build.assert_called_once()
+        self.assertEqual(recipe_ingredient_index.version, version)
+
+    def test_rebuild_only_after_version_change(self):
+        self.get_ids(ingredients=f'{self.chicken.id}')
+        with mock.patch.object(indexes, 'RECIPE_INDEX_TTL', -1), \
+                mock.patch.object(
+                    RecipeIngredientIndex, '_build', return_value={}) as build:
+            recipe_ingredient_index.match((self.chicken.id,))
+            build.assert_not_called()
+            bump_version(IngredientRecipe)
+            recipe_ingredient_index.match((self.chicken.id,))
+            build.assert_called_once()
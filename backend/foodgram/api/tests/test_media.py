@@ -0,0 +1,73 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe
+from users.models import User
+
+
+class MediaStorageTest(APITestCase):
+    """Проверяет хранение изображений по хэшу и сборку мусора."""
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=self.media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Автор', password='pass')
+
+    def create_recipe(self, content: bytes) -> Recipe:
+        return Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст',
+            cooking_time=10, image=ContentFile(content, name='temp.PNG'))
+
+    def test_deduplication(self):
+        first = self.create_recipe(b'image')
+        second = self.create_recipe(b'image')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.endswith('.png'))
+        self.assertNotEqual(
+            first.image.name, self.create_recipe(b'other').image.name)
+
+    def test_deduplication_protects_from_gc(self):
+        orphan = self.create_recipe(b'image')
+        path = orphan.image.path
+        os.utime(path, (0, 0))
+        Recipe.objects.filter(pk=orphan.pk).delete()
+        # Та же картинка загружается для нового, еще не сохраненного
+        # рецепта.
+        name = orphan.image.storage.save('recipes/temp.png',
+                                         ContentFile(b'image'))
+        self.assertEqual(name, orphan.image.name)
+        call_command('gc_media', stdout=StringIO())
+        self.assertTrue(os.path.exists(path))
+
+    def test_gc_media(self):
+        recipe = self.create_recipe(b'image')
+        storage = recipe.image.storage
+        orphan = storage.save('recipes/temp.png', ContentFile(b'orphan'))
+        derivatives = []
+        for name in (recipe.image.name, orphan):
+            derivative = f'derivatives/card/{name}.webp'
+            os.makedirs(os.path.dirname(storage.path(derivative)),
+                        exist_ok=True)
+            with open(storage.path(derivative), 'wb') as file:
+                file.write(b'x')
+            derivatives.append(derivative)
+        call_command('gc_media', min_age=0, dry_run=True, stdout=StringIO())
+        self.assertTrue(storage.exists(orphan))
+        call_command('gc_media', stdout=StringIO())
+        self.assertTrue(storage.exists(orphan))
+        call_command('gc_media', min_age=0, batch_size=1, stdout=StringIO())
+        self.assertFalse(storage.exists(orphan))
+        self.assertFalse(storage.exists(derivatives[1]))
+        self.assertTrue(storage.exists(derivatives[0]))
+        self.assertTrue(os.path.exists(recipe.image.path))
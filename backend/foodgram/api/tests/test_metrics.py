@@ -0,0 +1,38 @@
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from api.middleware import QueryMetricsMiddleware
+from recipes.models import Tag
+
+
+def count_tags():
+    yield str(Tag.objects.count())
+    yield str(Tag.objects.count())
+
+
+@override_settings(QUERY_METRICS_ENABLED=True, QUERY_METRICS_SLOW_MS=0)
+class QueryMetricsTest(TestCase):
+    """Проверяет подсчет SQL-запросов middleware метрик."""
+
+    def test_headers(self):
+        def view(request):
+            return HttpResponse(str(Tag.objects.count()))
+
+        with self.assertLogs('api.middleware', 'WARNING'):
+            response = QueryMetricsMiddleware(view)(
+                RequestFactory().get('/api/tags/'))
+        self.assertEqual(response['X-DB-Queries'], '1')
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    def test_streaming_response(self):
+        """Запросы, выполненные при чтении потокового ответа, тоже
+        считаются."""
+        def view(request):
+            return StreamingHttpResponse(count_tags())
+
+        response = QueryMetricsMiddleware(view)(
+            RequestFactory().get('/api/recipes/download_shopping_cart/'))
+        self.assertNotIn('X-DB-Queries', response)
+        with self.assertLogs('api.middleware', 'WARNING') as logs:
+            self.assertEqual(b''.join(response.streaming_content), b'00')
+        self.assertIn(': 2 запросов', logs.output[0])
@@ -0,0 +1,302 @@
+import csv
+import io
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from api import indexes
+from api.response_cache import recipe_card_cache, recipe_list_cache
+from recipes import feed, shopping_list
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            Shopping_cart, Tag)
+from recipes.versions import bump_version
+from users.models import Subscription, User
+
+AUTHORS_COUNT = 3
+RECIPES_PER_AUTHOR = 4
+INGREDIENTS_PER_RECIPE = 5
+
+
+class QueryBudgetTest(APITestCase):
+    """Проверяет, что эндпоинты API укладываются в бюджет SQL-запросов.
+
+    Бюджет задается для фиксированного набора данных: новый N+1
+    в сериализаторе сразу выводит эндпоинт за его пределы.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Читатель', last_name='Читатель', password='pass')
+        cls.authors = [
+            User.objects.create_user(
+                email=f'author{i}@foodgram.ru', username=f'author{i}',
+                first_name='Автор', last_name=str(i), password='pass')
+            for i in range(AUTHORS_COUNT)
+        ]
+        cls.tags = [
+            Tag.objects.create(name='Завтрак', color='#E26C2D',
+                               slug='breakfast'),
+            Tag.objects.create(name='Обед', color='#49B64E', slug='lunch'),
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(INGREDIENTS_PER_RECIPE)
+        ]
+        for author in cls.authors:
+            for i in range(RECIPES_PER_AUTHOR):
+                recipe = Recipe.objects.create(
+                    author=author, name=f'Рецепт {author.username} {i}',
+                    image='recipes/test.png', text='Описание',
+                    cooking_time=10)
+                recipe.tags.add(*cls.tags)
+                IngredientRecipe.objects.bulk_create(
+                    IngredientRecipe(recipe=recipe, ingredient=ingredient,
+                                     amount=i + 1)
+                    for ingredient in cls.ingredients
+                )
+                Favorite.objects.create(user=cls.reader, recipe=recipe)
+                Shopping_cart.objects.create(user=cls.reader, recipe=recipe)
+            Subscription.objects.create(subscriber=cls.reader, author=author)
+            feed.backfill(cls.reader, author)
+        shopping_list.rebuild([cls.reader.pk])
+        cls.recipe = Recipe.objects.first()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def count_queries(self, url: str, client=None,
+                      warm: bool = False) -> int:
+        """Выполняет GET-запрос и возвращает количество SQL-запросов.
+        Если не задан warm, кэши ответов перед запросом очищаются."""
+        if not warm:
+            recipe_list_cache.clear()
+            recipe_card_cache.clear()
+            cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = (client or self.client).get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+        return len(context.captured_queries)
+
+    def assert_budget(self, url: str, budget: int, client=None) -> None:
+        queries = self.count_queries(url, client)
+        self.assertLessEqual(
+            queries, budget,
+            f'{url}: {queries} SQL-запросов при бюджете {budget}'
+        )
+
+    def assert_flat(self, url: str, client=None) -> None:
+        """Количество запросов не зависит от размера страницы."""
+        small = self.count_queries(f'{url}limit=1', client)
+        large = self.count_queries(f'{url}limit=50', client)
+        self.assertEqual(
+            small, large,
+            f'{url}: {small} запросов на 1 объект и {large} на 50'
+        )
+
+    def test_recipes(self):
+        anonymous = APIClient()
+        # Список читает еще и версии моделей для ключей кэша.
+        self.assert_budget('/api/recipes/', 5)
+        self.assert_budget('/api/recipes/', 5, anonymous)
+        self.assert_budget('/api/recipes/?is_favorited=1', 5)
+        self.assert_budget(f'/api/recipes/?author={self.authors[0].id}', 6)
+        self.assert_budget(f'/api/recipes/{self.recipe.id}/', 4)
+        self.assert_flat('/api/recipes/?')
+        self.assert_flat('/api/recipes/?', anonymous)
+        self.assert_flat('/api/recipes/?tags=breakfast&is_in_shopping_cart=1&')
+        self.assert_budget('/api/recipes/?pagination=cursor', 4)
+        self.assert_flat('/api/recipes/?pagination=cursor&')
+
+    def test_recipes_content(self):
+        """Флаги пользователя и порядок рецептов: новые первыми."""
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+        for client, flag in ((self.client, True), (APIClient(), False)):
+            for url in ('/api/recipes/?limit=50',
+                        '/api/recipes/?pagination=cursor&limit=50'):
+                response = client.get(url)
+                recipes = response.data['results']
+                self.assertEqual(
+                    [recipe['id'] for recipe in recipes], expected, url)
+                for recipe in recipes:
+                    self.assertIs(recipe['is_favorited'], flag, url)
+                    self.assertIs(recipe['is_in_shopping_cart'], flag, url)
+                    self.assertIs(
+                        recipe['author']['is_subscribed'], flag, url)
+        Favorite.objects.filter(recipe=self.recipe).delete()
+        response = self.client.get('/api/recipes/?is_favorited=1&limit=50')
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [recipe_id for recipe_id in expected
+             if recipe_id != self.recipe.id])
+
+    def test_recipes_from_cache(self):
+        """Карточки рецептов берутся из кэша: остаются версии моделей,
+        подсчет и страница с флагами пользователя."""
+        for url in ('/api/recipes/', '/api/recipes/?is_favorited=1'):
+            self.count_queries(url)
+            self.assertEqual(self.count_queries(url, warm=True), 3, url)
+
+    def test_feed(self):
+        self.assert_budget('/api/recipes/feed/', 3)
+        self.assert_flat('/api/recipes/feed/?')
+
+    def test_not_modified(self):
+        """Повторный запрос с If-None-Match не загружает связи рецепта."""
+        for url, budget in ((f'/api/recipes/{self.recipe.id}/', 2),
+                            ('/api/tags/', 1),
+                            ('/api/ingredients/?name=Ингр', 0)):
+            etag = self.client.get(url)['ETag']
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(
+                response.status_code, status.HTTP_304_NOT_MODIFIED, url)
+            self.assertLessEqual(len(context.captured_queries), budget, url)
+        anonymous_etag = APIClient().get(
+            f'/api/recipes/{self.recipe.id}/')['ETag']
+        response = self.client.get(
+            f'/api/recipes/{self.recipe.id}/',
+            HTTP_IF_NONE_MATCH=anonymous_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_ingredient_change_modifies_etag(self):
+        """Правка ингредиента рецепта в обход рецепта меняет ETag."""
+        url = f'/api/recipes/{self.recipe.id}/'
+        etag = self.client.get(url)['ETag']
+        item = self.recipe.ingredientrecipe_set.first()
+        item.amount += 1
+        item.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(
+            item.amount,
+            [ingredient['amount']
+             for ingredient in response.data['ingredients']])
+
+    def test_download_shopping_cart(self):
+        for format in ('txt', 'csv', 'json', 'pdf'):
+            self.assert_budget(
+                f'/api/recipes/download_shopping_cart/?format={format}', 1)
+        self.assert_budget('/api/recipes/shopping_list/', 1)
+
+    def test_download_shopping_cart_content(self):
+        """Во всех форматах выгружаются суммы ингредиентов по всем
+        рецептам корзины."""
+        amount = AUTHORS_COUNT * sum(range(1, RECIPES_PER_AUTHOR + 1))
+        rows = [(ingredient.name, 'г', amount)
+                for ingredient in self.ingredients]
+        contents = {}
+        for format in ('txt', 'csv', 'json', 'pdf'):
+            response = self.client.get(
+                f'/api/recipes/download_shopping_cart/?format={format}')
+            self.assertEqual(
+                response['Content-Disposition'],
+                f'attachment; filename=shopping_cart.{format}')
+            contents[format] = b''.join(response.streaming_content)
+        self.assertEqual(
+            contents['txt'].decode().splitlines()[2:],
+            [f'{name}, {unit}, {amount}' for name, unit, amount in rows])
+        self.assertEqual(
+            list(csv.reader(io.StringIO(contents['csv'].decode()))),
+            [['name', 'measurement_unit', 'amount']]
+            + [[name, unit, str(amount)] for name, unit, amount in rows])
+        self.assertEqual(
+            json.loads(contents['json']),
+            [{'name': name, 'measurement_unit': unit, 'amount': amount}
+             for name, unit, amount in rows])
+        self.assertTrue(contents['pdf'].startswith(b'%PDF'))
+        self.assertTrue(contents['pdf'].rstrip().endswith(b'%%EOF'))
+
+    def test_users(self):
+        self.assert_budget('/api/users/', 2)
+        self.assert_budget('/api/users/', 2, APIClient())
+        self.assert_budget(f'/api/users/{self.authors[0].id}/', 1)
+        self.assert_budget('/api/users/me/', 1)
+        self.assert_flat('/api/users/?')
+
+    def test_subscriptions(self):
+        self.assert_budget('/api/users/subscriptions/?recipes_limit=2', 3)
+        self.assert_budget('/api/users/subscriptions/', 3)
+        self.assert_budget(
+            '/api/users/subscriptions/?pagination=cursor&recipes_limit=2', 2)
+        self.assert_flat('/api/users/subscriptions/?recipes_limit=2&')
+        self.assert_flat(
+            '/api/users/subscriptions/?pagination=cursor&recipes_limit=2&')
+
+    def test_subscriptions_recipes_limit(self):
+        response = self.client.get(
+            '/api/users/subscriptions/?recipes_limit=2')
+        for author in response.data['results']:
+            self.assertTrue(author['is_subscribed'])
+            self.assertEqual(author['recipes_count'], RECIPES_PER_AUTHOR)
+            self.assertEqual(
+                [recipe['id'] for recipe in author['recipes']],
+                list(Recipe.objects.filter(
+                    author_id=author['id']).values_list('id', flat=True)[:2])
+            )
+
+    def test_ingredients(self):
+        # Сверка версии Ingredient и загрузка индекса.
+        self.assert_budget('/api/ingredients/', 2)
+        self.assert_budget('/api/ingredients/?name=Ингр', 0)
+        self.assert_budget('/api/ingredients/?name=редиент', 0)
+        self.assert_budget(f'/api/ingredients/{self.ingredients[0].id}/', 1)
+
+    def test_ingredient_import_in_other_process(self):
+        """Индекс замечает ингредиенты, добавленные в обход сигналов,
+        по версии Ingredient, и вместе с ними меняется ETag."""
+        etag = self.client.get('/api/ingredients/?name=рис')['ETag']
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Рис', measurement_unit='г')])
+        bump_version(Ingredient)
+        with mock.patch.object(indexes, 'INGREDIENT_INDEX_TTL', -1):
+            response = self.client.get(
+                '/api/ingredients/?name=рис', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.data], ['Рис'])
+        self.assertNotEqual(response['ETag'], etag)
+        with mock.patch.object(indexes, 'INGREDIENT_INDEX_TTL', -1), \
+                CaptureQueriesContext(connection) as context:
+            self.client.get('/api/ingredients/?name=рис')
+        self.assertEqual(
+            [query['sql'] for query in context.captured_queries
+             if Ingredient._meta.db_table in query['sql']], [],
+            'Индекс перестроен без смены версии.')
+
+    def test_ingredients_content(self):
+        """Индекс отдает совпадения по началу названия раньше
+        совпадений по подстроке, без учета регистра."""
+        with self.captureOnCommitCallbacks(execute=True):
+            for name in ('Бурый рис', 'рисовая мука', 'Рис'):
+                Ingredient.objects.create(name=name, measurement_unit='г')
+        response = self.client.get('/api/ingredients/?name=РИС')
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.data],
+            ['Рис', 'рисовая мука', 'Бурый рис'])
+        self.assertEqual(
+            set(response.data[0]), {'id', 'name', 'measurement_unit'})
+        response = self.client.get('/api/ingredients/?name=редиент')
+        self.assertEqual(
+            [ingredient['id'] for ingredient in response.data],
+            [ingredient.id for ingredient in self.ingredients])
+        response = self.client.get('/api/ingredients/')
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.data],
+            sorted(Ingredient.objects.values_list('name', flat=True),
+                   key=str.casefold))
+
+    def test_tags(self):
+        self.assert_budget('/api/tags/', 2)
+        self.assert_budget(f'/api/tags/{self.tags[0].id}/', 2)
@@ -0,0 +1,95 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from users.models import User
+
+
+class RecipeUpdateTest(APITestCase):
+    """Проверяет частичное обновление рецепта по разнице."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Автор', password='pass')
+        cls.breakfast, cls.lunch, cls.dinner = (
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', '#FF0000', 'breakfast'),
+                ('Обед', '#00FF00', 'lunch'),
+                ('Ужин', '#0000FF', 'dinner')))
+        cls.flour, cls.egg, cls.milk = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Мука', 'Яйцо', 'Молоко'))
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Блины', text='Текст', cooking_time=30,
+            image='recipes/test.png')
+        cls.recipe.tags.add(cls.breakfast, cls.lunch)
+        IngredientRecipe.objects.bulk_create((
+            IngredientRecipe(recipe=cls.recipe, ingredient=cls.flour,
+                             amount=200),
+            IngredientRecipe(recipe=cls.recipe, ingredient=cls.egg,
+                             amount=2),
+        ))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def patch(self, data: dict):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query['sql'] for query in queries.captured_queries]
+
+    def get_amounts(self) -> dict:
+        return dict(IngredientRecipe.objects.filter(
+            recipe=self.recipe).values_list('ingredient_id', 'amount'))
+
+    def test_partial_update_keeps_relations(self):
+        self.patch({'name': 'Оладьи'})
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'Оладьи')
+        self.assertEqual(self.recipe.text, 'Текст')
+        self.assertEqual(
+            set(self.recipe.tags.all()), {self.breakfast, self.lunch})
+        self.assertEqual(
+            self.get_amounts(), {self.flour.id: 200, self.egg.id: 2})
+
+    def test_amount_change_updates_one_row(self):
+        flour_row = IngredientRecipe.objects.get(ingredient=self.flour)
+        sql = self.patch({'ingredients': [
+            {'id': self.flour.id, 'amount': 250},
+            {'id': self.egg.id, 'amount': 2},
+        ]})
+        table = IngredientRecipe._meta.db_table
+        self.assertFalse(any(
+            query.startswith(('DELETE', 'INSERT')) and table in query
+            for query in sql))
+        self.assertEqual(
+            IngredientRecipe.objects.get(ingredient=self.flour).pk,
+            flour_row.pk)
+        self.assertEqual(
+            self.get_amounts(), {self.flour.id: 250, self.egg.id: 2})
+
+    def test_diff_update(self):
+        self.patch({
+            'tags': [self.lunch.id, self.dinner.id],
+            'ingredients': [
+                {'id': self.flour.id, 'amount': 200},
+                {'id': self.milk.id, 'amount': 500},
+            ],
+        })
+        self.assertEqual(
+            set(self.recipe.tags.all()), {self.lunch, self.dinner})
+        self.assertEqual(
+            self.get_amounts(), {self.flour.id: 200, self.milk.id: 500})
+
+    def test_empty_tags_rejected(self):
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.id}/', {'tags': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,72 @@
+import base64
+import io
+
+from PIL import Image
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from api.serializers import RecipeCreateSerializer
+from recipes.models import Ingredient, Tag
+from users.models import User
+
+INGREDIENTS = 25
+
+
+def make_data_uri() -> str:
+    output = io.BytesIO()
+    Image.new('RGB', (1, 1)).save(output, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(output.getvalue()).decode())
+
+
+class BulkRelatedFieldTest(APITestCase):
+    """Проверяет проверку тегов и ингредиентов рецепта пачкой."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Автор', password='pass')
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}')
+            for number in range(3)
+        ]
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(INGREDIENTS))
+        cls.ingredients = list(Ingredient.objects.order_by('id'))
+
+    def get_serializer(self, tags: list, ingredients: list):
+        request = APIRequestFactory().post('/api/recipes/')
+        request.user = self.author
+        return RecipeCreateSerializer(data={
+            'name': 'Рецепт', 'text': 'Текст', 'cooking_time': 10,
+            'image': make_data_uri(),
+            'tags': tags,
+            'ingredients': [
+                {'id': pk, 'amount': 10} for pk in ingredients
+            ],
+        }, context={'request': request})
+
+    def test_one_query_per_model(self):
+        serializer = self.get_serializer(
+            [tag.id for tag in self.tags],
+            [ingredient.id for ingredient in self.ingredients])
+        with self.assertNumQueries(2):
+            self.assertTrue(serializer.is_valid())
+        self.assertEqual(
+            serializer.validated_data['tags'], self.tags)
+        self.assertEqual(
+            [item['id'] for item in serializer.validated_data['ingredients']],
+            self.ingredients)
+
+    def test_all_missing_ids_reported(self):
+        serializer = self.get_serializer(
+            [self.tags[0].id, 998, 999],
+            [self.ingredients[0].id, 998, 999])
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('998, 999', str(serializer.errors['tags'][0]))
+        self.assertEqual(
+            [bool(errors) for errors in serializer.errors['ingredients']],
+            [False, True, True])
@@ -0,0 +1,178 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.indexes import recipe_ingredient_index
+from api.response_cache import recipe_card_cache, recipe_list_cache
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            Shopping_cart, Tag)
+from recipes.versions import bump_version
+from users.models import Subscription, User
+
+
+class ResponseCacheTestCase(APITestCase):
+    """Рецепт с тегами и пустые кэши ответов перед каждым тестом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Автор', password='pass')
+        cls.breakfast, cls.dinner = (
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (('Завтрак', '#00FF00', 'breakfast'),
+                                      ('Ужин', '#FF0000', 'dinner')))
+        cls.rice = Ingredient.objects.create(name='Рис', measurement_unit='г')
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Каша', text='Текст', cooking_time=20,
+            image='recipes/test.png')
+        cls.recipe.tags.add(cls.breakfast, cls.dinner)
+
+    def setUp(self):
+        recipe_list_cache.clear()
+        recipe_card_cache.clear()
+        cache.clear()
+
+    def get(self, url: str = '/api/recipes/', **params):
+        """Выполняет запрос и возвращает ответ и число SQL-запросов."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(context.captured_queries)
+
+
+class RecipeListCacheTest(ResponseCacheTestCase):
+    """Проверяет кэш списка рецептов для анонимных пользователей."""
+
+    def test_repeated_request_reads_only_versions(self):
+        first, _ = self.get(tags=['breakfast', 'dinner'])
+        second, queries = self.get(tags=['dinner', 'breakfast'], limit='')
+        self.assertEqual(queries, 1)
+        self.assertEqual(second.data, first.data)
+        recipe_list_cache.clear()
+        _, queries = self.get(tags=['dinner', 'breakfast'])
+        self.assertEqual(queries, 1, 'Ответ не найден в общем кэше.')
+
+    def test_changes_invalidate_cache(self):
+        changes = (
+            lambda: Recipe.objects.get(pk=self.recipe.pk).save(),
+            lambda: IngredientRecipe.objects.create(
+                recipe=self.recipe, ingredient=self.rice, amount=100),
+            lambda: Tag.objects.filter(pk=self.dinner.pk).get().save(),
+            lambda: User.objects.get(pk=self.author.pk).save(),
+        )
+        for change in changes:
+            self.get()
+            change()
+            _, queries = self.get()
+            self.assertGreater(queries, 1)
+
+    def test_stale_index_does_not_poison_shared_cache(self):
+        """Ответ процесса с отстающим индексом ингредиентов не отдается
+        процессу с актуальным индексом."""
+        rice = f'{self.rice.id}'
+        recipe_ingredient_index.invalidate()
+        self.get(ingredients=rice)
+        # Другой процесс добавляет ингредиент рецепту.
+        IngredientRecipe.objects.bulk_create([IngredientRecipe(
+            recipe=self.recipe, ingredient=self.rice, amount=100)])
+        bump_version(IngredientRecipe)
+        response, _ = self.get(ingredients=rice)
+        self.assertEqual(response.data['results'], [])
+        # Процесс с перестроенным индексом.
+        recipe_list_cache.clear()
+        recipe_ingredient_index.invalidate()
+        response, _ = self.get(ingredients=rice)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.recipe.id])
+
+    def test_recipe_update_is_visible(self):
+        self.get()
+        self.client.force_authenticate(self.author)
+        self.get()
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.id}/', {'name': 'Плов'},
+            format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response, _ = self.get()
+        self.assertEqual(response.data['results'][0]['name'], 'Плов')
+        self.client.force_authenticate(None)
+        response, _ = self.get()
+        self.assertEqual(response.data['results'][0]['name'], 'Плов')
+
+    def test_login_keeps_cache(self):
+        self.get()
+        self.author.last_login = timezone.now()
+        self.author.save(update_fields=('last_login',))
+        _, queries = self.get()
+        self.assertEqual(queries, 1)
+
+    def test_authenticated_and_search_are_not_cached(self):
+        self.get(search='каша')
+        _, queries = self.get(search='каша')
+        self.assertGreater(queries, 1)
+        self.client.force_authenticate(self.author)
+        self.get()
+        _, queries = self.get()
+        self.assertGreater(queries, 1)
+
+
+class RecipeCardCacheTest(ResponseCacheTestCase):
+    """Проверяет общие карточки рецептов с флагами пользователя."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.reader = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Читатель', last_name='Читатель', password='pass')
+        Favorite.objects.create(user=cls.reader, recipe=cls.recipe)
+        Shopping_cart.objects.create(user=cls.reader, recipe=cls.recipe)
+        Subscription.objects.create(subscriber=cls.reader, author=cls.author)
+
+    def get_card(self, user) -> tuple:
+        self.client.force_authenticate(user)
+        response, queries = self.get()
+        return response.data['results'][0], queries
+
+    def test_cards_are_shared_between_users(self):
+        author_card, cold = self.get_card(self.author)
+        reader_card, warm = self.get_card(self.reader)
+        self.assertLess(warm, cold)
+        self.assertEqual(
+            (author_card['is_favorited'], author_card['is_in_shopping_cart'],
+             author_card['author']['is_subscribed']),
+            (False, False, False))
+        self.assertEqual(
+            (reader_card['is_favorited'], reader_card['is_in_shopping_cart'],
+             reader_card['author']['is_subscribed']),
+            (True, True, True))
+        self.assertEqual(
+            list(reader_card), list(author_card),
+            'Порядок полей карточки изменился.')
+
+    def test_flags_follow_toggles(self):
+        self.get_card(self.reader)
+        self.client.delete(f'/api/recipes/{self.recipe.id}/favorite/')
+        card, _ = self.get_card(self.reader)
+        self.assertFalse(card['is_favorited'])
+        self.assertTrue(card['is_in_shopping_cart'])
+
+    def test_author_change_invalidates_card(self):
+        self.get_card(self.reader)
+        User.objects.filter(pk=self.author.pk).update(first_name='Повар')
+        card, _ = self.get_card(self.reader)
+        self.assertEqual(card['author']['first_name'], 'Повар')
+
+    def test_ingredient_change_invalidates_card(self):
+        item = IngredientRecipe.objects.create(
+            recipe=self.recipe, ingredient=self.rice, amount=100)
+        self.get_card(self.reader)
+        item.amount = 200
+        item.save()
+        card, _ = self.get_card(self.reader)
+        self.assertEqual(card['ingredients'][0]['amount'], 200)
@@ -0,0 +1,55 @@
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe
+from users.models import User
+
+
+class SearchTest(APITestCase):
+    """Проверяет полнотекстовый поиск рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Автор', password='pass')
+        cls.borscht = cls.create_recipe(
+            'Борщ украинский', 'Свекла, капуста и говядина.')
+        cls.salad = cls.create_recipe(
+            'Винегрет', 'Салат со свеклой и огурцами.')
+        cls.pie = cls.create_recipe('Пирог', 'Тесто с яблоками.')
+
+    @classmethod
+    def create_recipe(cls, name: str, text: str) -> Recipe:
+        return Recipe.objects.create(
+            author=cls.author, name=name, text=text, cooking_time=10,
+            image='recipes/test.png')
+
+    def search(self, query: str) -> list:
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_search_by_name_and_text(self):
+        self.assertEqual(self.search('борщ'), [self.borscht.id])
+        self.assertEqual(
+            set(self.search('свекл')), {self.borscht.id, self.salad.id})
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_name_match_ranks_higher(self):
+        baked = self.create_recipe('Свекла запеченная', 'Фольга и соль.')
+        self.assertEqual(self.search('свекла')[0], baked.id)
+
+    def test_popular_recipe_ranks_higher(self):
+        for recipe in (self.borscht, self.salad):
+            Recipe.objects.filter(pk=recipe.pk).update(favorites_count=1000)
+            self.assertEqual(self.search('свекл')[0], recipe.id)
+            Recipe.objects.filter(pk=recipe.pk).update(favorites_count=0)
+
+    def test_index_follows_changes(self):
+        self.pie.name = 'Шарлотка'
+        self.pie.save()
+        self.assertEqual(self.search('шарлотка'), [self.pie.id])
+        self.assertEqual(self.search('пирог'), [])
+        self.pie.delete()
+        self.assertEqual(self.search('шарлотка'), [])
@@ -0,0 +1,138 @@
+from io import StringIO
+
+from django.core.management import call_command
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from recipes import shopping_list
+from recipes.models import (Ingredient, IngredientRecipe, Recipe,
+                            Shopping_cart, ShoppingListItem)
+from users.models import User
+
+
+class ShoppingListTest(APITestCase):
+    """Проверяет, что сохраненные списки покупок совпадают
+    с рецептами в корзинах после любых изменений."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Автор', password='pass')
+        cls.readers = [
+            User.objects.create_user(
+                email=f'reader{i}@foodgram.ru', username=f'reader{i}',
+                first_name='Читатель', last_name=str(i), password='pass')
+            for i in range(2)
+        ]
+        cls.flour, cls.egg, cls.milk = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Мука', 'Яйцо', 'Молоко'))
+        cls.pancakes = cls.create_recipe(
+            'Блины', (cls.flour, 200), (cls.egg, 2))
+        cls.omelette = cls.create_recipe(
+            'Омлет', (cls.egg, 3), (cls.milk, 100))
+
+    @classmethod
+    def create_recipe(cls, name: str, *ingredients) -> Recipe:
+        recipe = Recipe.objects.create(
+            author=cls.author, name=name, text='Текст', cooking_time=10,
+            image='recipes/test.png')
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=recipe, ingredient=ingredient,
+                             amount=amount)
+            for ingredient, amount in ingredients)
+        return recipe
+
+    def setUp(self):
+        self.clients = []
+        for reader in self.readers:
+            client = APIClient()
+            client.force_authenticate(reader)
+            self.clients.append(client)
+        for client in self.clients:
+            for recipe in (self.pancakes, self.omelette):
+                response = client.post(
+                    f'/api/recipes/{recipe.id}/shopping_cart/')
+                self.assertEqual(
+                    response.status_code, status.HTTP_201_CREATED)
+
+    def get_list(self, user) -> dict:
+        return shopping_list.get_actual([user.pk]).get(user.pk, {})
+
+    def assert_consistent(self, expected: dict = None) -> None:
+        user_ids = [reader.pk for reader in self.readers]
+        self.assertEqual(
+            shopping_list.get_actual(user_ids),
+            shopping_list.get_expected(user_ids))
+        if expected is not None:
+            for reader in self.readers:
+                self.assertEqual(self.get_list(reader), expected)
+
+    def test_add_and_remove(self):
+        self.assert_consistent(
+            {self.flour.id: 200, self.egg.id: 5, self.milk.id: 100})
+        response = self.clients[0].delete(
+            f'/api/recipes/{self.omelette.id}/shopping_cart/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            self.get_list(self.readers[0]), {self.flour.id: 200,
+                                             self.egg.id: 2})
+        self.assert_consistent()
+
+    def test_api_edit(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.patch(
+            f'/api/recipes/{self.pancakes.id}/',
+            {'ingredients': [{'id': self.flour.id, 'amount': 250},
+                             {'id': self.milk.id, 'amount': 300}]},
+            format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assert_consistent(
+            {self.flour.id: 250, self.egg.id: 3, self.milk.id: 400})
+
+    def test_api_delete_recipe(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.delete(f'/api/recipes/{self.omelette.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assert_consistent({self.flour.id: 200, self.egg.id: 2})
+
+    def test_admin_edits(self):
+        """Правки в админке сохраняют строки рецепта по одной."""
+        row = IngredientRecipe.objects.get(
+            recipe=self.pancakes, ingredient=self.flour)
+        row.amount = 150
+        row.save()
+        self.assert_consistent(
+            {self.flour.id: 150, self.egg.id: 5, self.milk.id: 100})
+        row.ingredient = self.milk
+        row.save()
+        self.assert_consistent({self.egg.id: 5, self.milk.id: 250})
+        IngredientRecipe.objects.create(
+            recipe=self.pancakes, ingredient=self.flour, amount=50)
+        IngredientRecipe.objects.get(
+            recipe=self.omelette, ingredient=self.egg).delete()
+        self.assert_consistent(
+            {self.flour.id: 50, self.egg.id: 2, self.milk.id: 250})
+
+    def test_admin_delete_recipe(self):
+        self.pancakes.delete()
+        self.assertFalse(
+            Shopping_cart.objects.filter(recipe=self.pancakes.id).exists())
+        self.assert_consistent({self.egg.id: 3, self.milk.id: 100})
+
+    def test_command(self):
+        ShoppingListItem.objects.filter(
+            user=self.readers[0], ingredient=self.egg).update(total_amount=1)
+        output = StringIO()
+        call_command('shopping_lists', stdout=output)
+        self.assertIn('списков с расхождениями: 1', output.getvalue())
+        self.assertEqual(self.get_list(self.readers[0])[self.egg.id], 1)
+        call_command('shopping_lists', rebuild=True, stdout=output)
+        self.assert_consistent(
+            {self.flour.id: 200, self.egg.id: 5, self.milk.id: 100})
+        output = StringIO()
+        call_command('shopping_lists', stdout=output)
+        self.assertIn('списков с расхождениями: 0', output.getvalue())
@@ -0,0 +1,117 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from rest_framework import status
+from rest_framework.test import APIClient, APITransactionTestCase
+
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            Shopping_cart, ShoppingListItem)
+from users.models import Subscription, User
+
+THREADS = 8
+
+
+class ToggleTest(APITransactionTestCase):
+    """Проверяет, что одновременные запросы к одной паре не приводят
+    к дубликатам, ошибкам 500 и расхождению счетчиков."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Автор', password='pass')
+        self.reader = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Читатель', last_name='Читатель', password='pass')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст',
+            cooking_time=10, image='recipes/test.png')
+
+    def hammer(self, method: str, url: str, data=None) -> list:
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('SQLite в памяти блокирует таблицы целиком, '
+                          'нужна файловая база.')
+        barrier = threading.Barrier(THREADS)
+
+        def send():
+            client = APIClient()
+            client.force_authenticate(self.reader)
+            barrier.wait()
+            try:
+                response = getattr(client, method)(url, data, format='json')
+                return response.status_code, response.data
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(THREADS) as executor:
+            futures = [executor.submit(send) for _ in range(THREADS)]
+        return [future.result() for future in futures]
+
+    def hammer_statuses(self, method: str, url: str) -> list:
+        return sorted(code for code, _ in self.hammer(method, url))
+
+    def test_favorite(self):
+        url = f'/api/recipes/{self.recipe.id}/favorite/'
+        self.assertEqual(
+            self.hammer_statuses('post', url),
+            [status.HTTP_201_CREATED] + [status.HTTP_400_BAD_REQUEST]
+            * (THREADS - 1))
+        self.assertEqual(Favorite.objects.count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(
+            self.hammer_statuses('delete', url),
+            [status.HTTP_204_NO_CONTENT] + [status.HTTP_400_BAD_REQUEST]
+            * (THREADS - 1))
+        self.assertFalse(Favorite.objects.exists())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_shopping_cart(self):
+        url = f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        self.assertEqual(
+            self.hammer_statuses('post', url),
+            [status.HTTP_201_CREATED] + [status.HTTP_400_BAD_REQUEST]
+            * (THREADS - 1))
+        self.assertEqual(Shopping_cart.objects.count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.carts_count, 1)
+        self.assertEqual(
+            self.hammer_statuses('delete', url),
+            [status.HTTP_204_NO_CONTENT] + [status.HTTP_400_BAD_REQUEST]
+            * (THREADS - 1))
+        self.assertFalse(Shopping_cart.objects.exists())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.carts_count, 0)
+
+    def test_subscription(self):
+        url = f'/api/users/{self.author.id}/subscribe/'
+        self.assertEqual(
+            self.hammer_statuses('post', url),
+            [status.HTTP_201_CREATED] + [status.HTTP_400_BAD_REQUEST]
+            * (THREADS - 1))
+        self.assertEqual(Subscription.objects.count(), 1)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 1)
+
+    def test_bulk_shopping_cart(self):
+        IngredientRecipe.objects.create(
+            recipe=self.recipe, amount=10,
+            ingredient=Ingredient.objects.create(
+                name='Мука', measurement_unit='г'))
+        responses = self.hammer(
+            'post', '/api/recipes/shopping_cart/', {'ids': [self.recipe.id]})
+        statuses = sorted(
+            data['results'][0]['status'] for _, data in responses)
+        self.assertEqual(statuses, ['created'] + ['exists'] * (THREADS - 1))
+        self.assertEqual(Shopping_cart.objects.count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.carts_count, 1)
+        self.assertEqual(
+            ShoppingListItem.objects.get(user=self.reader).total_amount, 10)
+
+    def test_missing_recipe(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        response = client.delete('/api/recipes/999/favorite/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,81 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import TestCase
+
+from recipes import transfer
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from users.models import User
+
+RECIPES_COUNT = 5
+
+
+class RecipeTransferTest(TestCase):
+    """Проверяет выгрузку и возобновляемую загрузку рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Автор', password='pass')
+        tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast')
+        ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г')
+        for i in range(RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {i}', text='Текст',
+                cooking_time=10, image=f'recipes/{i}.jpg')
+            recipe.tags.add(tag)
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=i + 1)
+
+    def export(self) -> str:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'recipes.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(transfer.export_recipes(chunk_size=2))
+        return path
+
+    def test_round_trip(self):
+        path = self.export()
+        pub_date = Recipe.objects.get(name='Рецепт 3').pub_date
+        Recipe.objects.all().delete()
+        User.objects.all().delete()
+        Tag.objects.all().delete()
+        Ingredient.objects.all().delete()
+        self.assertEqual(
+            list(transfer.import_recipes(path, 'test', chunk_size=2)),
+            [2, 4, 5])
+        recipe = Recipe.objects.get(name='Рецепт 3')
+        self.assertEqual(recipe.author.email, 'author@foodgram.ru')
+        self.assertEqual(recipe.author.recipes_count, RECIPES_COUNT)
+        self.assertFalse(recipe.author.has_usable_password())
+        self.assertEqual(list(recipe.tags.values_list('slug', flat=True)),
+                         ['breakfast'])
+        self.assertEqual(recipe.ingredientrecipe_set.get().amount, 4)
+        self.assertEqual(recipe.image.name, 'recipes/3.jpg')
+        self.assertEqual(recipe.pub_date, pub_date)
+
+    def test_resume(self):
+        path = self.export()
+        import_chunk = transfer.import_chunk
+        calls = []
+
+        def failing_chunk(records):
+            calls.append(records)
+            if len(calls) == 2:
+                raise transfer.TransferError('Сбой')
+            import_chunk(records)
+
+        with mock.patch.object(transfer, 'import_chunk', failing_chunk):
+            with self.assertRaises(transfer.TransferError):
+                list(transfer.import_recipes(path, 'test', chunk_size=2))
+        self.assertEqual(Recipe.objects.count(), RECIPES_COUNT + 2)
+        self.assertEqual(
+            list(transfer.import_recipes(path, 'test', chunk_size=2)), [4, 5])
+        self.assertEqual(Recipe.objects.count(), RECIPES_COUNT * 2)
+        self.assertEqual(
+            list(transfer.import_recipes(path, 'test', chunk_size=2)), [])
@@ -1,15 +1,29 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from foodgram.settings import ASYNC_READS
+
+from .async_views import async_read_view
 from .views import (IngredientViewSet, RecipeViewSet,
                     TagViewSet, CustomUserViewSet)
 
+ASYNC_READ_ROUTES = (
+    'recipes-list', 'recipes-detail', 'recipes-get-feed',
+    'tags-list', 'tags-detail', 'ingredients-list', 'ingredients-detail',
+    'users-get-subscriptions',
+)
+
 router = DefaultRouter()
 router.register('users', CustomUserViewSet, basename='users')
 router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
 
+if ASYNC_READS:
+    for pattern in router.urls:
+        if pattern.name in ASYNC_READ_ROUTES:
+            pattern.callback = async_read_view(pattern.callback)
+
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,16 +1,122 @@
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Window, sql
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework import status
 
+from recipes import feed, shopping_list
+from recipes.counters import COUNTERS, change_counter, change_counters
 from recipes.models import Recipe, Shopping_cart, Favorite
-from .serializers import (FavoriteSerializer, ShoppingCartSerializer,
-                          RecipeMiniSerializer)
+from recipes.rows import delete_rows
+from users.models import Subscription
+from .serializers import BulkIdsSerializer, RecipeMiniSerializer
 
 
-MODELS = {
-    Shopping_cart: ShoppingCartSerializer,
-    Favorite: FavoriteSerializer
+# Поле владельца связи для одиночных и массовых операций.
+OWNER_FIELDS = {
+    Favorite: 'user_id',
+    Shopping_cart: 'user_id',
+    Subscription: 'subscriber_id',
 }
+DUPLICATE_MESSAGES = {
+    Favorite: 'Этот рецепт уже в вашем списке избранного!',
+    Shopping_cart: 'Этот рецепт уже в вашем списке покупок!',
+    Subscription: 'Вы уже подписались на этого автора',
+}
+SELF_SUBSCRIPTION_MESSAGE = (
+    'Ты, конечно, супер, но дай другим подписаться на тебя!')
+CREATED = 'created'
+DELETED = 'deleted'
+EXISTS = 'exists'
+MISSING = 'missing'
+NOT_FOUND = 'not_found'
+SELF_SUBSCRIPTION = 'self_subscription'
+
+
+def duplicate_error(model) -> ValidationError:
+    return ValidationError(
+        {api_settings.NON_FIELD_ERRORS_KEY: [DUPLICATE_MESSAGES[model]]})
+
+
+def insert_row(model, owner, foreign_key: str, owner_pk: int,
+               pk: int) -> bool:
+    """Вставляет связь одним INSERT, пропускающим дубликат по
+    уникальному ограничению модели (ON CONFLICT DO NOTHING, в SQLite
+    INSERT OR IGNORE). Возвращает True, если строка добавлена.
+
+    Параллельные запросы не могут вставить дубликат или получить
+    IntegrityError, а число вставленных строк известно точно.
+    Сигнал post_save не отправляется.
+    """
+    query = sql.InsertQuery(model, ignore_conflicts=True)
+    query.insert_values(
+        [field for field in model._meta.local_concrete_fields
+         if not field.primary_key],
+        [model(**{owner: owner_pk, foreign_key: pk})]
+    )
+    with connection.cursor() as cursor:
+        for statement, params in query.get_compiler(
+                connection=connection).as_sql():
+            cursor.execute(statement, params)
+        return cursor.rowcount > 0
+
+
+def insert_rows(model, owner, foreign_key: str, owner_pk: int,
+                pks: list) -> set:
+    """Вставляет связи с объектами pks, пропуская дубликаты, и возвращает
+    id объектов, строки для которых действительно добавлены.
+
+    В PostgreSQL это один INSERT ... ON CONFLICT DO NOTHING RETURNING.
+    СУБД без RETURNING для нескольких строк, например SQLite, вставляют
+    строки по одной с проверкой числа вставленных строк. Строки
+    вставляются по возрастанию id: пересекающиеся параллельные запросы
+    блокируют их в одном порядке и не попадают во взаимную блокировку.
+    """
+    pks = sorted(pks)
+    if not pks:
+        return set()
+    if not connection.features.can_return_rows_from_bulk_insert:
+        return {
+            pk for pk in pks
+            if insert_row(model, owner, foreign_key, owner_pk, pk)
+        }
+    query = sql.InsertQuery(model, ignore_conflicts=True)
+    query.insert_values(
+        [field for field in model._meta.local_concrete_fields
+         if not field.primary_key],
+        [model(**{owner: owner_pk, foreign_key: pk}) for pk in pks]
+    )
+    compiler = query.get_compiler(connection=connection)
+    compiler.returning_fields = [model._meta.get_field(foreign_key)]
+    [(statement, params)] = compiler.as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(statement, params)
+        return {pk for pk, in cursor.fetchall()}
+
+
+def insert_relation(model, user, pk: int) -> bool:
+    """Добавляет связь и увеличивает счетчик объекта, если строка
+    действительно вставлена. Возвращает True, если связь добавлена."""
+    owner, foreign_key, target, counter = get_relation(model)
+    inserted = insert_row(model, owner, foreign_key, user.pk, pk)
+    if inserted:
+        change_counter(target, pk, counter, 1)
+    return inserted
+
+
+def delete_relation(model, user, pk: int) -> bool:
+    """Удаляет связь одним DELETE без выборки объектов и сигналов
+    post_delete. Возвращает True, если строка была."""
+    owner, foreign_key, target, counter = get_relation(model)
+    deleted = delete_rows(
+        model.objects.filter(**{owner: user.pk, foreign_key: pk})) > 0
+    if deleted:
+        change_counter(target, pk, counter, -1)
+    return deleted
 
 
 def post_request(self, model, request, pk) -> Response:
@@ -19,22 +125,137 @@ def post_request(self, model, request, pk) -> Response:
         recipe: Recipe = get_object_or_404(Recipe, pk=pk)
     except Exception:
         return Response(status=status.HTTP_400_BAD_REQUEST)
-    serializer = MODELS[model](
-        data={'user': request.user.id, 'recipe': recipe.id}
-    )
-    serializer.is_valid(raise_exception=True)
-    serializer.save()
+    with transaction.atomic():
+        if not insert_relation(model, request.user, recipe.pk):
+            raise duplicate_error(model)
+        if model is Shopping_cart:
+            shopping_list.add_recipe(request.user, recipe)
     show_serializer = RecipeMiniSerializer(recipe)
     return Response(show_serializer.data, status=status.HTTP_201_CREATED)
 
 
 def delete_request(self, model, request, pk) -> Response:
-    """Обрабатывает DELETE запрос."""
-    recipe: Recipe = get_object_or_404(Recipe, pk=pk)
-    try:
-        current_recipe = get_object_or_404(
-            model, user=request.user, recipe=recipe)
-    except Exception:
-        return Response(status=status.HTTP_400_BAD_REQUEST)
-    current_recipe.delete()
-    return Response(status=status.HTTP_204_NO_CONTENT)
+    """Обрабатывает DELETE запрос. Наличие рецепта проверяется,
+    только если удалять было нечего."""
+    with transaction.atomic():
+        deleted = delete_relation(model, request.user, pk)
+        if deleted and model is Shopping_cart:
+            shopping_list.remove_recipe(request.user, Recipe(pk=pk))
+    if deleted:
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    get_object_or_404(Recipe, pk=pk)
+    return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+def get_relation(model) -> tuple:
+    """Возвращает поле владельца, внешний ключ на объект, модель
+    объекта и поле его счетчика для модели связи."""
+    for source, target, foreign_key, field in COUNTERS:
+        if source is model:
+            return OWNER_FIELDS[model], foreign_key, target, field
+    raise KeyError(model)
+
+
+def bulk_add(model, user, ids: list) -> list:
+    """Добавляет связи пользователя с объектами ids.
+
+    Существование объектов и уже добавленные связи проверяются одним
+    запросом. Остальные связи вставляются insert_rows, которая
+    сообщает, какие строки действительно добавлены: параллельный
+    запрос мог добавить их после проверки. Счетчики, список покупок
+    и лента меняются только для действительно вставленных связей.
+    Возвращает результат для каждого id.
+    """
+    owner, foreign_key, target, counter = get_relation(model)
+    ids = list(dict.fromkeys(ids))
+    objects = target.objects.filter(pk__in=ids).only(counter).annotate(
+        is_added=Exists(
+            model.objects.filter(
+                **{owner: user.pk, foreign_key: OuterRef('pk')}))
+    ).order_by().in_bulk()
+    results, added = {}, []
+    for pk in ids:
+        obj = objects.get(pk)
+        if obj is None:
+            results[pk] = NOT_FOUND
+        elif obj.is_added:
+            results[pk] = EXISTS
+        elif model is Subscription and pk == user.pk:
+            results[pk] = SELF_SUBSCRIPTION
+        else:
+            added.append(obj)
+    with transaction.atomic():
+        inserted = insert_rows(model, owner, foreign_key, user.pk,
+                               [obj.pk for obj in added])
+        for obj in added:
+            results[obj.pk] = CREATED if obj.pk in inserted else EXISTS
+        added = sorted(
+            (obj for obj in added if obj.pk in inserted),
+            key=lambda obj: obj.pk)
+        change_counters(target, [obj.pk for obj in added], counter, 1)
+        if model is Shopping_cart:
+            shopping_list.add_recipes(user, [obj.pk for obj in added])
+        elif model is Subscription:
+            for author in added:
+                author.subscribers_count += 1
+                feed.backfill(user, author)
+    return [{'id': pk, 'status': results[pk]} for pk in ids]
+
+
+def bulk_delete(model, user, ids: list) -> list:
+    """Удаляет связи пользователя с объектами ids одним DELETE.
+    Возвращает результат для каждого id."""
+    owner, foreign_key, target, counter = get_relation(model)
+    ids = list(dict.fromkeys(ids))
+    with transaction.atomic():
+        relations = model.objects.filter(
+            **{owner: user.pk, f'{foreign_key}__in': ids})
+        deleted = set(relations.select_for_update().values_list(
+            foreign_key, flat=True))
+        if deleted:
+            delete_rows(relations)
+        change_counters(target, deleted, counter, -1)
+        if model is Shopping_cart:
+            shopping_list.remove_recipes(user, deleted)
+        elif model is Subscription:
+            for author_id in deleted:
+                feed.trim(user, target(pk=author_id))
+    return [
+        {'id': pk, 'status': DELETED if pk in deleted else MISSING}
+        for pk in ids
+    ]
+
+
+def bulk_request(model, request) -> Response:
+    """Обрабатывает массовый POST или DELETE со списком id."""
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = serializer.validated_data['ids']
+    if request.method == 'POST':
+        results = bulk_add(model, request.user, ids)
+    else:
+        results = bulk_delete(model, request.user, ids)
+    return Response({'results': results})
+
+
+def get_recent_recipes(author_ids, limit: int):
+    """Возвращает по limit последних рецептов каждого автора.
+
+    Рецепты нумеруются внутри автора функцией ROW_NUMBER(), поэтому
+    выборка для всей страницы подписок делается одним запросом.
+    Django 3.2 не умеет фильтровать по оконным функциям, так что
+    нумерованная выборка подставляется подзапросом.
+    """
+    ranked = Recipe.objects.filter(author_id__in=author_ids).annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('pub_date').desc(), F('id').desc()]
+        )
+    ).order_by().values('id', 'row_number')
+    ranked_sql, params = ranked.query.sql_with_params()
+    return Recipe.objects.filter(id__in=RawSQL(
+        f'SELECT ranked.id FROM ({ranked_sql}) ranked '
+        f'WHERE ranked.row_number <= %s',
+        (*params, limit)
+    ))
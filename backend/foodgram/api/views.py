@@ -1,25 +1,45 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch,
+                              Value, prefetch_related_objects)
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from requests import Request
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
+from recipes import feed
 from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                            Shopping_cart, Tag)
+                            Shopping_cart, ShoppingListItem, Tag)
+from recipes.versions import get_label, get_versions
 from users.models import Subscription, User
 
-from .pagination import CustomPagination
+from .conditional import (ConditionalCatalogMixin, make_etag, not_modified,
+                          set_validators)
+from .derivatives import render_derivative
+from .filters import RecipeFilter
+from .indexes import ingredient_index
+from .pagination import (CustomPagination, RecipeCursorPagination,
+                         SubscriptionCursorPagination, is_cursor_requested)
 from .permissions import IsAuthorOrAdminOrReadOnly
-from .filters import IngredientSearchFilter, RecipeFilter
+from .renderers import (ShoppingListCSVRenderer, ShoppingListJSONRenderer,
+                        ShoppingListPDFRenderer, ShoppingListTextRenderer)
+from .response_cache import (RECIPE_LIST_MODELS, recipe_card_cache,
+                             recipe_list_cache)
 from .serializers import (CustomUserSerializer, IngredientSerializer,
                           RecipeCreateSerializer, RecipeSerializer,
-                          SubscriptionSerializer, SubscriptionShowSerializer,
-                          TagSerializer)
-from .utils import delete_request, post_request
+                          ShoppingListItemSerializer,
+                          SubscriptionShowSerializer, TagSerializer)
+from .utils import (SELF_SUBSCRIPTION_MESSAGE, bulk_request, delete_relation,
+                    delete_request, duplicate_error, get_recent_recipes,
+                    insert_relation, post_request)
+
+SHOPPING_LIST_CHUNK_SIZE = 500
+DERIVATIVE_MAX_AGE = 365 * 24 * 60 * 60
 
 
 class CustomUserViewSet(UserViewSet):
@@ -35,6 +55,16 @@ class CustomUserViewSet(UserViewSet):
             self.permission_classes = (permissions.IsAuthenticated, )
         return super().get_permissions()
 
+    def get_queryset(self):
+        """Аннотирует пользователей флагом подписки текущего пользователя."""
+        queryset = super().get_queryset()
+        if self.request.user.is_anonymous:
+            return queryset
+        return queryset.annotate(is_subscribed=Exists(
+            Subscription.objects.filter(
+                subscriber=self.request.user, author=OuterRef('pk'))
+        ))
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
@@ -45,26 +75,38 @@ class CustomUserViewSet(UserViewSet):
         """Позволяет пользователю подписываться и отписываться от авторов."""
         author: User = get_object_or_404(User, id=id)
         if request.method == 'POST':
-            serializer = SubscriptionSerializer(
-                data={'subscriber': request.user.id, 'author': author.id}
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
+            if author == request.user:
+                raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                    SELF_SUBSCRIPTION_MESSAGE]})
+            with transaction.atomic():
+                if not insert_relation(Subscription, request.user, author.pk):
+                    raise duplicate_error(Subscription)
+                author.refresh_from_db(fields=('subscribers_count',))
+                feed.backfill(request.user, author)
             author_serializer = SubscriptionShowSerializer(
                 author, context={'request': request}
             )
             return Response(
                 author_serializer.data, status=status.HTTP_201_CREATED
             )
-        try:
-            subscription: Subscription = get_object_or_404(
-                Subscription, subscriber=request.user, author=author
-            )
-        except Exception:
+        with transaction.atomic():
+            deleted = delete_relation(Subscription, request.user, author.pk)
+            if deleted:
+                feed.trim(request.user, author)
+        if not deleted:
             return Response(status=status.HTTP_400_BAD_REQUEST)
-        subscription.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='subscribe',
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def bulk_subscribe(self, request: Request) -> Response:
+        """Подписывает на авторов из списка ids или отписывает от них."""
+        return bulk_request(Subscription, request)
+
     @action(
         detail=False,
         methods=['GET'],
@@ -73,18 +115,30 @@ class CustomUserViewSet(UserViewSet):
     )
     def get_subscriptions(self, request: Request) -> Response:
         """Отображение подписок."""
-        queryset = User.objects.filter(author__subscriber=request.user)
-        paginator = CustomPagination()
+        queryset = User.objects.filter(
+            author__subscriber=request.user
+        ).annotate(
+            subscription_id=F('author__id'),
+            is_subscribed=Value(True, output_field=BooleanField())
+        )
+        paginator = (SubscriptionCursorPagination()
+                     if is_cursor_requested(request) else CustomPagination())
         result_pages = paginator.paginate_queryset(
             queryset=queryset, request=request
         )
+        limit = request.query_params.get('recipes_limit', '')
+        recipes = (get_recent_recipes([user.pk for user in result_pages],
+                                      int(limit))
+                   if limit.isdigit() else Recipe.objects.all())
+        prefetch_related_objects(result_pages, Prefetch(
+            'recipes', queryset=recipes, to_attr='recent_recipes'))
         serializer = SubscriptionShowSerializer(
             result_pages, context={'request': request}, many=True
         )
         return paginator.get_paginated_response(serializer.data)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalCatalogMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для создания обьектов класса Tag."""
 
     queryset = Tag.objects.all()
@@ -92,17 +146,32 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (permissions.AllowAny,)
     pagination_class = None
 
+    def get_validators(self) -> tuple:
+        version, updated_at = get_versions(Tag)[get_label(Tag)]
+        return make_etag('tags', version), updated_at
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+
+class IngredientViewSet(ConditionalCatalogMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """Вьюсет для создания обьектов класса Ingredient."""
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (permissions.AllowAny,)
     pagination_class = None
-    filter_backends = (DjangoFilterBackend, )
-    filterset_class = IngredientSearchFilter
-    search_fields = ('^name', )
+
+    def get_validators(self) -> tuple:
+        return make_etag('ingredients', ingredient_index.checksum), None
+
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        return self.conditional(request, self.search)
+
+    def search(self, request: Request) -> Response:
+        """Отдает ингредиенты из индекса в памяти, не обращаясь к БД."""
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        return Response(ingredient_index.all())
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -115,6 +184,93 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    @property
+    def paginator(self):
+        """Включает курсорную пагинацию по флагу ?pagination=cursor."""
+        if is_cursor_requested(self.request):
+            self.pagination_class = RecipeCursorPagination
+        return super().paginator
+
+    @staticmethod
+    def get_prefetches() -> tuple:
+        return (
+            'tags',
+            Prefetch(
+                'ingredientrecipe_set',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            )
+        )
+
+    def get_queryset(self):
+        """Собирает рецепты одним запросом: автор, теги и ингредиенты
+        подгружаются заранее, флаги текущего пользователя аннотируются.
+        При просмотре рецепта связи загружаются только после проверки
+        ETag, в списке — только для рецептов, которых нет в кэше."""
+        user = self.request.user
+        queryset = Recipe.objects.select_related('author')
+        if self.action not in ('list', 'retrieve'):
+            queryset = queryset.prefetch_related(*self.get_prefetches())
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return queryset.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                is_author_subscribed=false
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(Shopping_cart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_author_subscribed=Exists(Subscription.objects.filter(
+                subscriber=user, author=OuterRef('author')))
+        )
+
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        """Собирает страницу из общих карточек рецептов с флагами
+        текущего пользователя. Анонимным пользователям страница целиком
+        отдается из кэша: он сбрасывается сменой версий моделей."""
+        versions = get_versions(*RECIPE_LIST_MODELS)
+        cacheable = recipe_list_cache.is_cacheable(request)
+        if cacheable:
+            key = recipe_list_cache.make_key(request, versions)
+            data = recipe_list_cache.get(key)
+            if data is not None:
+                return Response(data)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        data = recipe_card_cache.get_cards(
+            list(queryset) if page is None else page, request, versions,
+            self.serialize_cards)
+        if page is None:
+            return Response(data)
+        response = self.get_paginated_response(data)
+        if cacheable:
+            recipe_list_cache.set(key, response.data)
+        return response
+
+    def serialize_cards(self, recipes: list) -> list:
+        prefetch_related_objects(recipes, *self.get_prefetches())
+        return self.get_serializer(recipes, many=True).data
+
+    def retrieve(self, request: Request, *args, **kwargs) -> Response:
+        """Отвечает 304, если рецепт, справочники и флаги текущего
+        пользователя не изменились с прошлого запроса клиента."""
+        recipe: Recipe = self.get_object()
+        versions = get_versions(Tag, Ingredient)
+        author = recipe.author
+        etag = make_etag(
+            recipe.pk, recipe.updated_at, versions, request.get_host(),
+            author.email, author.username, author.first_name,
+            author.last_name, recipe.is_favorited,
+            recipe.is_in_shopping_cart, recipe.is_author_subscribed
+        )
+        response = not_modified(request, etag)
+        if response is None:
+            prefetch_related_objects([recipe], *self.get_prefetches())
+            response = Response(self.get_serializer(recipe).data)
+        return set_validators(response, etag)
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
@@ -140,32 +296,87 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return post_request(self, Shopping_cart, request, pk)
         return delete_request(self, Shopping_cart, request, pk)
 
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='favorite',
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def bulk_favorite(self, request: Request) -> Response:
+        """Добавляет в избранное или убирает из него рецепты
+        из списка ids."""
+        return bulk_request(Favorite, request)
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='shopping_cart',
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def bulk_shopping_cart(self, request: Request) -> Response:
+        """Добавляет в список покупок или убирает из него рецепты
+        из списка ids."""
+        return bulk_request(Shopping_cart, request)
+
     @action(
         detail=False,
         methods=['GET'],
-        url_path='download_shopping_cart',
+        url_path='feed',
         permission_classes=(permissions.IsAuthenticated,)
     )
-    def download_shopping_cart(self, request: Request) -> HttpResponse:
-        """Позволяет текущему пользователю скачать список покупок."""
-        ingredients = IngredientRecipe.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).order_by(
-            'ingredient__name'
-        ).annotate(total_amount=Sum('amount'))
-        content_list = []
-        for ingredient in ingredients:
-            content_list.append(
-                f'{ingredient["ingredient__name"]}, '
-                f'{ingredient["ingredient__measurement_unit"]}, '
-                f'{ingredient["total_amount"]}')
-        content = 'Ваш список покупок:\n\n' + '\n'.join(content_list)
-        filename = 'shopping_cart.txt'
-        response = HttpResponse(content, content_type='text/plain')
+    def get_feed(self, request: Request) -> Response:
+        """Лента новых рецептов авторов, на которых подписан
+        текущий пользователь, с курсорной пагинацией."""
+        queryset = feed.get_feed(
+            self.filter_queryset(self.get_queryset()), request.user)
+        paginator = RecipeCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @staticmethod
+    def get_shopping_list_items(user):
+        """Список покупок пользователя, собранный заранее
+        при изменении корзины."""
+        return ShoppingListItem.objects.filter(
+            user=user, total_amount__gt=0
+        ).select_related('ingredient').order_by('ingredient__name')
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        url_path='shopping_list',
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def get_shopping_list(self, request: Request) -> Response:
+        """Отдает список покупок текущего пользователя в JSON."""
+        serializer = ShoppingListItemSerializer(
+            self.get_shopping_list_items(request.user), many=True)
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        url_path='download_shopping_cart',
+        permission_classes=(permissions.IsAuthenticated,),
+        renderer_classes=(ShoppingListTextRenderer, ShoppingListCSVRenderer,
+                          ShoppingListJSONRenderer, ShoppingListPDFRenderer)
+    )
+    def download_shopping_cart(self, request: Request
+                               ) -> StreamingHttpResponse:
+        """Позволяет текущему пользователю скачать список покупок
+        в формате txt, csv, json или pdf (параметр ?format=)."""
+        ingredients = self.get_shopping_list_items(request.user).values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'total_amount'
+        ).iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients), content_type=content_type)
         response['Content-Disposition'] = (
-            'attachment; filename={0}'.format(filename))
+            'attachment; filename=shopping_cart.{0}'.format(renderer.format))
         return response
 
     def get_serializer_class(self):
@@ -174,3 +385,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if self.request.method == 'GET':
             return RecipeSerializer
         return RecipeCreateSerializer
+
+
+def image_derivative(request, variant: str, name: str) -> FileResponse:
+    """Отдает вариант изображения рецепта, создавая его при первом
+    запросе. В продакшене nginx отдает уже созданные файлы сам."""
+    path, content_type = render_derivative(variant, name)
+    response = FileResponse(open(path, 'rb'), content_type=content_type)
+    response['Cache-Control'] = (
+        f'public, max-age={DERIVATIVE_MAX_AGE}, immutable')
+    return response
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -31,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,14 +62,23 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+DB_ENGINE = os.getenv('DB_ENGINE', 'django.db.backends.postgresql')
+# SQLite в памяти блокирует таблицы целиком, поэтому тесты одновременных
+# запросов по умолчанию идут на временной файловой базе.
+TEST_DB_NAME = os.getenv('TEST_DB_NAME')
+if not TEST_DB_NAME and DB_ENGINE == 'django.db.backends.sqlite3':
+    TEST_DB_NAME = os.path.join(
+        tempfile.gettempdir(), f'foodgram_test_{os.getpid()}.sqlite3')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': DB_ENGINE,
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'TEST': {'NAME': TEST_DB_NAME},
     }
 }
 
@@ -105,6 +116,9 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CSV_FILES_DIR = os.path.join(BASE_DIR, 'data')
 
+PDF_FONT_PATH = os.getenv(
+    'PDF_FONT_PATH', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
@@ -131,4 +145,53 @@ DJOSER = {
         'user': ['rest_framework.permissions.AllowAny']}
 }
 
-PAGE_SIZE = os.getenv('PAGE_SIZE')
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', 6))
+BULK_MAX_IDS = int(os.getenv('BULK_MAX_IDS', 100))
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+# Как часто индекс ингредиентов сверяет версию Ingredient.
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 10))
+# Как часто индекс рецептов по ингредиентам сверяет версию
+# IngredientRecipe; перестраивается он, только если версия изменилась.
+RECIPE_INDEX_TTL = int(os.getenv('RECIPE_INDEX_TTL', 10))
+# Больше стольких id из индекса фильтр передает базе подзапросом EXISTS,
+# а не списком параметров.
+RECIPE_INDEX_MAX_IDS = int(os.getenv('RECIPE_INDEX_MAX_IDS', 1000))
+
+FEED_FANOUT_THRESHOLD = int(os.getenv('FEED_FANOUT_THRESHOLD', 10000))
+FEED_BACKFILL_LIMIT = int(os.getenv('FEED_BACKFILL_LIMIT', 100))
+
+# Вклад популярности в ранжирование поиска: релевантность умножается
+# на 1 + вес * ln(1 + число добавлений в избранное).
+SEARCH_POPULARITY_WEIGHT = float(os.getenv('SEARCH_POPULARITY_WEIGHT', 0.2))
+
+IMAGE_MAX_SIZE = int(os.getenv('IMAGE_MAX_SIZE', 10 * 1024 * 1024))
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 25_000_000))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+# Включается в foodgram/asgi.py: под WSGI асинхронные представления
+# только добавили бы накладные расходы.
+ASYNC_READS = os.getenv('ASYNC_READS', 'False') == 'True'
+
+CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', 3600))
+
+# Общий кэш процессов. По умолчанию кэш в памяти процесса, для общего
+# кэша нескольких процессов подходит, например, FileBasedCache.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+# Кэш списка рецептов для анонимных пользователей: LRU в памяти
+# процесса и общий кэш RECIPE_CACHE_ALIAS.
+RECIPE_CACHE_ALIAS = os.getenv('RECIPE_CACHE_ALIAS', 'default')
+RECIPE_CACHE_TTL = int(os.getenv('RECIPE_CACHE_TTL', 300))
+RECIPE_CACHE_LRU_SIZE = int(os.getenv('RECIPE_CACHE_LRU_SIZE', 256))
+# Кэш карточек рецептов, общий для всех пользователей.
+RECIPE_CARD_TTL = int(os.getenv('RECIPE_CARD_TTL', 3600))
+RECIPE_CARD_LRU_SIZE = int(os.getenv('RECIPE_CARD_LRU_SIZE', 1024))
+
+QUERY_METRICS_ENABLED = os.getenv('QUERY_METRICS_ENABLED', 'False') == 'True'
+QUERY_METRICS_SLOW_MS = int(os.getenv('QUERY_METRICS_SLOW_MS', 100))
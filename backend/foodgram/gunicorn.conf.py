@@ -0,0 +1,14 @@
+import os
+
+# wsgi — синхронные воркеры, asgi — воркеры uvicorn, в которых читающие
+# эндпоинты выполняются параллельно в пуле потоков.
+SERVER_PROFILE = os.getenv('SERVER_PROFILE', 'wsgi')
+
+bind = '0.0.0.0:8000'
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+
+if SERVER_PROFILE == 'asgi':
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
@@ -40,9 +40,10 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('author', 'name', 'tags')
 
     def count_favorite(self, object):
-        return object.favorite.count()
+        return object.favorites_count
 
     count_favorite.short_description = 'Количество добавлений в избранное'
+    count_favorite.admin_order_field = 'favorites_count'
 
 
 class FavoriteAdmin(admin.ModelAdmin):
@@ -0,0 +1,66 @@
+from django.db.models import Count, F
+
+from users.models import Subscription, User
+
+from .models import Favorite, Recipe, Shopping_cart
+
+# Модель-источник, модель со счетчиком, внешний ключ источника, поле счетчика.
+COUNTERS = (
+    (Favorite, Recipe, 'recipe_id', 'favorites_count'),
+    (Shopping_cart, Recipe, 'recipe_id', 'carts_count'),
+    (Recipe, User, 'author_id', 'recipes_count'),
+    (Subscription, User, 'author_id', 'subscribers_count'),
+)
+
+
+def change_counter(model, pk, field: str, delta: int) -> None:
+    """Атомарно изменяет счетчик одним UPDATE, не опуская его ниже нуля."""
+    if pk is None:
+        return
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def change_counters(model, pks, field: str, delta: int) -> None:
+    """Изменяет счетчик сразу у нескольких объектов одним UPDATE."""
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def reconcile(model, fields: list, batch_size: int) -> int:
+    """Пересчитывает счетчики модели пачками по возрастанию id
+    и исправляет расхождения. Возвращает число исправленных объектов."""
+    counters = [
+        (source, foreign_key, field)
+        for source, target, foreign_key, field in COUNTERS
+        if target is model and field in fields
+    ]
+    fixed = 0
+    last_id = 0
+    while True:
+        objects = list(model.objects.filter(pk__gt=last_id).order_by(
+            'pk').only('pk', *fields)[:batch_size])
+        if not objects:
+            return fixed
+        last_id = objects[-1].pk
+        ids = [obj.pk for obj in objects]
+        changed = set()
+        actual = {
+            field: dict(source.objects.filter(
+                **{f'{foreign_key}__in': ids}
+            ).values(foreign_key).order_by().annotate(
+                total=Count('pk')
+            ).values_list(foreign_key, 'total'))
+            for source, foreign_key, field in counters
+        }
+        for obj in objects:
+            for field, totals in actual.items():
+                if getattr(obj, field) != totals.get(obj.pk, 0):
+                    setattr(obj, field, totals.get(obj.pk, 0))
+                    changed.add(obj)
+        model.objects.bulk_update(changed, fields)
+        fixed += len(changed)
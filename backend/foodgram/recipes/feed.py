@@ -0,0 +1,63 @@
+from django.db.models import Q
+
+from foodgram.settings import FEED_BACKFILL_LIMIT, FEED_FANOUT_THRESHOLD
+from users.models import Subscription
+
+from .models import FeedItem, Recipe
+
+FEED_BATCH_SIZE = 1000
+
+
+def is_fanned_out(author) -> bool:
+    """Проверяет, рассылаются ли рецепты автора по лентам подписчиков."""
+    return author.subscribers_count <= FEED_FANOUT_THRESHOLD
+
+
+def fan_out(recipe) -> None:
+    """Добавляет новый рецепт в ленты подписчиков автора."""
+    if not is_fanned_out(recipe.author):
+        return
+    subscriber_ids = Subscription.objects.filter(
+        author=recipe.author
+    ).values_list('subscriber_id', flat=True)
+    FeedItem.objects.bulk_create(
+        (FeedItem(subscriber_id=subscriber_id, recipe=recipe)
+         for subscriber_id in subscriber_ids.iterator(
+             chunk_size=FEED_BATCH_SIZE)),
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def backfill(subscriber, author) -> None:
+    """Добавляет в ленту нового подписчика последние рецепты автора."""
+    if not is_fanned_out(author):
+        return
+    recipe_ids = Recipe.objects.filter(author=author).order_by(
+        '-pub_date', '-id').values_list('id', flat=True)
+    FeedItem.objects.bulk_create(
+        (FeedItem(subscriber=subscriber, recipe_id=recipe_id)
+         for recipe_id in recipe_ids[:FEED_BACKFILL_LIMIT]),
+        ignore_conflicts=True
+    )
+
+
+def trim(subscriber, author) -> None:
+    """Убирает из ленты рецепты автора, от которого пользователь
+    отписался."""
+    FeedItem.objects.filter(
+        subscriber=subscriber, recipe__author=author).delete()
+
+
+def get_feed(queryset, user):
+    """Оставляет в выборке рецептов ленту пользователя: записи
+    из его таблицы ленты и рецепты популярных авторов, на которых
+    он подписан."""
+    return queryset.filter(
+        Q(pk__in=FeedItem.objects.filter(
+            subscriber=user).values('recipe_id'))
+        | Q(author__in=Subscription.objects.filter(
+            subscriber=user,
+            author__subscribers_count__gt=FEED_FANOUT_THRESHOLD
+        ).values('author_id'))
+    )
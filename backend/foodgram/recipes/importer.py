@@ -0,0 +1,266 @@
+import csv
+import hashlib
+import json
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import CatalogImport, Ingredient, Tag
+from .streams import CopyFile, Echo
+from .versions import bump_version
+
+READ_CHUNK_SIZE = 64 * 1024
+JSON_SEPARATORS = ' \t\r\n,'
+
+# Поля файла, поля уникального ключа и поля, обновляемые при совпадении
+# ключа.
+CATALOGS = {
+    'ingredients': (Ingredient, ('name', 'measurement_unit'),
+                    ('name', 'measurement_unit'), ()),
+    'tags': (Tag, ('name', 'color', 'slug'), ('slug',), ('name', 'color')),
+}
+
+
+class ImportDataError(ValueError):
+    """Ошибка в данных импортируемого файла."""
+
+
+def get_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(READ_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_csv(file, fields: tuple):
+    """Читает строки CSV. Строка заголовка, если она есть, пропускается."""
+    for number, row in enumerate(csv.reader(file), 1):
+        if number == 1 and tuple(row) == fields:
+            continue
+        if len(row) != len(fields):
+            raise ImportDataError(
+                f'Строка {number}: ожидается {len(fields)} значения, '
+                f'получено {len(row)}.')
+        yield dict(zip(fields, row))
+
+
+def read_json(file, fields: tuple):
+    """Разбирает JSON-массив объектов по одному, не загружая файл
+    в память целиком."""
+    decoder = json.JSONDecoder()
+    buffer, position, started = '', 0, False
+    while True:
+        chunk = file.read(READ_CHUNK_SIZE)
+        buffer, position = buffer[position:] + chunk, 0
+        while True:
+            while (position < len(buffer)
+                   and buffer[position] in JSON_SEPARATORS):
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise ImportDataError('Ожидается JSON-массив объектов.')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise ImportDataError('Некорректный JSON.')
+                break
+            try:
+                yield {field: item[field] for field in fields}
+            except (KeyError, TypeError):
+                raise ImportDataError(
+                    f'Объект {item!r} должен содержать поля {fields}.')
+        if not chunk:
+            raise ImportDataError('Файл закончился до конца JSON-массива.')
+
+
+def read_rows(file, file_format: str, fields: tuple):
+    reader = read_json if file_format == 'json' else read_csv
+    for row in reader(file, fields):
+        yield {field: str(value).strip() for field, value in row.items()}
+
+
+def get_unique_fields(model, key: tuple) -> tuple:
+    """Возвращает уникальные поля модели, не входящие в ключ импорта."""
+    return tuple(
+        field.name for field in model._meta.concrete_fields
+        if field.unique and not field.primary_key and field.name not in key)
+
+
+def drop_conflicts(model, rows: dict, key: tuple) -> dict:
+    """Отбрасывает строки, у которых значение уникального поля вне
+    ключа уже занято объектом или предыдущей строкой с другим ключом.
+    Иначе такая строка нарушила бы ограничение и прервала импорт."""
+    fields = get_unique_fields(model, key)
+    if not fields:
+        return rows
+    owners = {field: {} for field in fields}
+    query = Q()
+    for field in fields:
+        query |= Q(**{
+            f'{field}__in': {row[field] for row in rows.values()}})
+    for values in model.objects.filter(query).values_list(*key, *fields):
+        for field, value in zip(fields, values[len(key):]):
+            owners[field][value] = values[:len(key)]
+    result = {}
+    for values, row in rows.items():
+        if any(owners[field].get(row[field], values) != values
+               for field in fields):
+            continue
+        for field in fields:
+            owners[field][row[field]] = values
+        result[values] = row
+    return result
+
+
+def upsert_batch(model, rows: list, key: tuple, updates: tuple) -> tuple:
+    """Добавляет новые строки пачки и обновляет изменившиеся.
+    Возвращает количество добавленных, обновленных и пропущенных."""
+    unique = drop_conflicts(model, {
+        tuple(row[field] for field in key): row for row in rows}, key)
+    existing = {
+        tuple(getattr(obj, field) for field in key): obj
+        for obj in model.objects.filter(**{
+            f'{key[0]}__in': {values[0] for values in unique}})
+    }
+    new, changed = [], []
+    for values, row in unique.items():
+        obj = existing.get(values)
+        if obj is None:
+            new.append(model(**row))
+        elif any(getattr(obj, field) != row[field] for field in updates):
+            for field in updates:
+                setattr(obj, field, row[field])
+            changed.append(obj)
+    model.objects.bulk_create(new, ignore_conflicts=True)
+    if changed:
+        model.objects.bulk_update(changed, updates)
+    return len(new), len(changed), len(rows) - len(new) - len(changed)
+
+
+def copy_upsert(model, rows, fields: tuple, key: tuple,
+                updates: tuple) -> tuple:
+    """Загружает строки во временную таблицу через COPY и переносит
+    их одним INSERT ... ON CONFLICT. Только для PostgreSQL.
+
+    ON CONFLICT срабатывает только по ключу, поэтому строки, занимающие
+    значения других уникальных полей, отбрасываются до вставки, как
+    в drop_conflicts.
+    """
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+
+    def get_columns(names, prefix=''):
+        return ', '.join(
+            prefix + quote(model._meta.get_field(name).column)
+            for name in names)
+
+    columns = get_columns(fields)
+    key_columns = get_columns(key)
+    if updates:
+        update_columns = [quote(
+            model._meta.get_field(field).column) for field in updates]
+        conflict = (
+            'DO UPDATE SET ' + ', '.join(
+                f'{column} = EXCLUDED.{column}' for column in update_columns)
+            + ' WHERE (' + ', '.join(
+                f'{table}.{column}' for column in update_columns)
+            + ') IS DISTINCT FROM (' + ', '.join(
+                f'EXCLUDED.{column}' for column in update_columns) + ')'
+        )
+    else:
+        conflict = 'DO NOTHING'
+    # Из повторов ключа берется последняя строка файла.
+    select = (
+        f'SELECT DISTINCT ON ({key_columns}) {columns}, import_position '
+        f'FROM import_rows ORDER BY {key_columns}, import_position DESC')
+    unique_columns = [
+        quote(model._meta.get_field(field).column)
+        for field in get_unique_fields(model, key)]
+    if unique_columns:
+        ranks = ', '.join(
+            f'row_number() OVER (PARTITION BY {column} '
+            f'ORDER BY import_position) AS rank_{number}'
+            for number, column in enumerate(unique_columns))
+        checks = [
+            f'rank_{number} = 1'
+            for number in range(len(unique_columns))] + [
+            f'NOT EXISTS (SELECT 1 FROM {table} AS existing '
+            f'WHERE existing.{column} = candidate.{column} '
+            f'AND ({get_columns(key, "existing.")}) '
+            f'<> ({get_columns(key, "candidate.")}))'
+            for column in unique_columns]
+        select = (
+            f'SELECT {columns} FROM (SELECT *, {ranks} FROM ({select}) '
+            f'AS last_rows) AS candidate WHERE ' + ' AND '.join(checks))
+    else:
+        select = f'SELECT {columns} FROM ({select}) AS candidate'
+
+    def lines():
+        writer = csv.writer(Echo())
+        for row in rows:
+            yield writer.writerow([row[field] for field in fields])
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE import_rows ON COMMIT DROP AS '
+            f'SELECT {columns} FROM {table} WITH NO DATA')
+        cursor.execute(
+            'ALTER TABLE import_rows ADD COLUMN import_position serial')
+        cursor.copy_expert(
+            f'COPY import_rows ({columns}) FROM STDIN WITH (FORMAT csv)',
+            CopyFile(lines()))
+        cursor.execute('SELECT COUNT(*) FROM import_rows')
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) {select} '
+            f'ON CONFLICT ({key_columns}) {conflict} '
+            f'RETURNING xmax = 0')
+        results = [inserted for inserted, in cursor.fetchall()]
+    inserted = sum(results)
+    updated = len(results) - inserted
+    return inserted, updated, total - inserted - updated
+
+
+def import_catalog(catalog: str, path: str, file_format: str,
+                   batch_size: int, force: bool = False,
+                   use_copy: bool = True) -> tuple:
+    """Импортирует справочник из файла CSV или JSON.
+
+    Возвращает количество добавленных, обновленных и пропущенных
+    строк или None, если файл не менялся с прошлого импорта.
+    """
+    model, fields, key, updates = CATALOGS[catalog]
+    checksum = get_checksum(path)
+    if not force and CatalogImport.objects.filter(
+            catalog=catalog, checksum=checksum).exists():
+        return None
+    with open(path, encoding='utf-8', newline='') as file, \
+            transaction.atomic():
+        rows = read_rows(file, file_format, fields)
+        if use_copy and connection.vendor == 'postgresql':
+            counts = copy_upsert(model, rows, fields, key, updates)
+        else:
+            counts = [0, 0, 0]
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                counts = [
+                    total + count for total, count in zip(
+                        counts, upsert_batch(model, batch, key, updates))
+                ]
+        CatalogImport.objects.update_or_create(
+            catalog=catalog, defaults={'checksum': checksum})
+        if counts[0] or counts[1]:
+            bump_version(model)
+    return tuple(counts)
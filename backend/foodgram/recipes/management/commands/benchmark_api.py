@@ -0,0 +1,76 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?pagination=cursor',
+    '/api/tags/',
+    '/api/ingredients/?name=сах',
+)
+
+
+def percentile(values: list, percent: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест читающих эндпоинтов: пропускная способность '
+            'и задержки p50/p99 при заданном числе параллельных клиентов. '
+            'Запускается против сервера в профиле wsgi и asgi.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8000')
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Эндпоинт для проверки, можно указать несколько раз.')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument('--token', help='Токен для авторизации.')
+
+    def handle(self, *args, **options):
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        urls = itertools.cycle(
+            options['base_url'] + quote(path, safe='/?=&')
+            for path in options['paths'] or DEFAULT_PATHS)
+        lock = threading.Lock()
+        latencies, errors = [], 0
+        deadline = time.monotonic() + options['duration']
+
+        def client():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                with lock:
+                    url = next(urls)
+                start = time.perf_counter()
+                try:
+                    with urlopen(Request(url, headers=headers)) as response:
+                        response.read()
+                except (URLError, OSError):
+                    with lock:
+                        errors += 1
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            clients = [executor.submit(client)
+                       for _ in range(options['concurrency'])]
+        for future in clients:
+            future.result()
+        latencies.sort()
+        self.stdout.write(self.style.SUCCESS(
+            f'Запросов: {len(latencies)}, ошибок: {errors}, '
+            f'RPS: {len(latencies) / options["duration"]:.1f}, '
+            f'p50: {percentile(latencies, 50) * 1000:.1f} мс, '
+            f'p99: {percentile(latencies, 99) * 1000:.1f} мс.'))
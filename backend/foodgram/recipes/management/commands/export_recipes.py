@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from recipes.transfer import export_recipes
+
+
+class Command(BaseCommand):
+    help = ('Выгрузка рецептов с тегами, ингредиентами, авторами '
+            'и ссылками на изображения в формате NDJSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', help='Файл для выгрузки. По умолчанию stdout.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        output = (open(options['output'], 'w', encoding='utf-8')
+                  if options['output'] else sys.stdout)
+        exported = 0
+        try:
+            for line in export_recipes(options['chunk_size']):
+                output.write(line)
+                exported += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        self.stderr.write(f'Выгружено рецептов: {exported}.')
@@ -0,0 +1,84 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+DERIVATIVES_DIR = 'derivatives'
+
+
+def walk(path: str):
+    """Обходит дерево каталогов, не собирая его целиком в память."""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+def get_original(name: str) -> str:
+    """Возвращает имя оригинала для уменьшенной копии изображения."""
+    if not name.startswith(f'{DERIVATIVES_DIR}/'):
+        return name
+    return name.split('/', 2)[-1].rpartition('.')[0]
+
+
+class Command(BaseCommand):
+    help = ('Удаление файлов изображений, на которые не ссылается '
+            'ни один рецепт, вместе с их уменьшенными копиями.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, сколько файлов будет удалено.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Не трогать файлы моложе указанного числа секунд, '
+                 'чтобы не удалить изображение еще не сохраненного рецепта.')
+
+    def handle(self, *args, **options):
+        field = Recipe._meta.get_field('image')
+        self.storage = field.storage
+        self.dry_run = options['dry_run']
+        self.deadline = time.time() - options['min_age']
+        self.checked = self.removed = self.freed = 0
+        batch = []
+        for directory in (field.upload_to, DERIVATIVES_DIR):
+            root = self.storage.path(directory)
+            if not os.path.isdir(root):
+                continue
+            for entry in walk(root):
+                batch.append(entry)
+                if len(batch) >= options['batch_size']:
+                    self.collect(batch)
+                    batch = []
+        self.collect(batch)
+        action = 'будет удалено' if self.dry_run else 'удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено файлов: {self.checked}, {action}: {self.removed} '
+            f'({self.freed / 1024 / 1024:.1f} МБ).'))
+
+    def collect(self, entries: list) -> None:
+        """Удаляет файлы пачки, на оригиналы которых нет ссылок."""
+        self.checked += len(entries)
+        names = {
+            entry.path: os.path.relpath(
+                entry.path, self.storage.location).replace(os.sep, '/')
+            for entry in entries
+        }
+        referenced = set(Recipe.objects.filter(
+            image__in={get_original(name) for name in names.values()}
+        ).values_list('image', flat=True))
+        for entry in entries:
+            stat = entry.stat(follow_symlinks=False)
+            name = names[entry.path]
+            if (get_original(name) in referenced
+                    or stat.st_mtime > self.deadline):
+                continue
+            self.removed += 1
+            self.freed += stat.st_size
+            if not self.dry_run:
+                self.storage.delete(name)
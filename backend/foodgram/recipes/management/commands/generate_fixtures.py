@@ -0,0 +1,188 @@
+import random
+from array import array
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from recipes import search
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            Shopping_cart, Tag)
+from recipes.versions import bump_version
+from users.models import Subscription, User
+
+TAG_NAMES = ('Завтрак', 'Обед', 'Ужин', 'Десерт', 'Выпечка', 'Салат',
+             'Суп', 'Напиток', 'Перекус', 'Вегетарианское')
+INGREDIENTS_PER_RECIPE = (3, 15, 7)
+POPULARITY_SKEW = 3
+
+
+class Command(BaseCommand):
+    help = ('Заполнение базы данных синтетическими пользователями, '
+            'рецептами, избранным, списками покупок и подписками.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=len(TAG_NAMES))
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--favorites', type=int, default=100000)
+        parser.add_argument('--carts', type=int, default=20000)
+        parser.add_argument('--subscriptions', type=int, default=10000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--image', default='recipes/temp.png',
+            help='Путь к изображению рецептов относительно MEDIA_ROOT.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        ingredient_ids = array(
+            'q', Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                'Сначала загрузите ингредиенты: python manage.py load_csv')
+        user_ids = self.create_users(options['users'])
+        tag_ids = self.create_tags(options['tags'])
+        recipe_ids = self.create_recipes(
+            options['recipes'], options['image'],
+            user_ids, tag_ids, ingredient_ids)
+        self.create_pairs(
+            Favorite, 'user_id', 'recipe_id', options['favorites'],
+            user_ids, recipe_ids)
+        self.create_pairs(
+            Shopping_cart, 'user_id', 'recipe_id', options['carts'],
+            user_ids, recipe_ids)
+        self.create_pairs(
+            Subscription, 'subscriber_id', 'author_id',
+            options['subscriptions'], user_ids, user_ids)
+        # bulk_create не отправляет сигналы, поэтому счетчики
+        # и списки покупок пересчитываются после загрузки.
+        call_command('reconcile_counters', batch_size=self.batch_size,
+                     stdout=self.stdout)
+        call_command('shopping_lists', rebuild=True,
+                     batch_size=self.batch_size, stdout=self.stdout)
+        for model in (User, Tag, Recipe, IngredientRecipe):
+            bump_version(model)
+        self.stdout.write(self.style.SUCCESS('Успешно загружено!'))
+
+    def popular(self, ids: array) -> int:
+        """Выбирает объект по степенному закону: первые
+        объекты выбираются значительно чаще последних."""
+        return ids[int(len(ids) * self.rng.random() ** POPULARITY_SKEW)]
+
+    def bulk_insert(self, model, objects: list) -> array:
+        """Вставляет объекты одним запросом и возвращает их id."""
+        last_id = model.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        model.objects.bulk_create(objects)
+        return array('q', model.objects.filter(
+            id__gt=last_id).order_by('id').values_list('id', flat=True))
+
+    def create_users(self, count: int) -> array:
+        password = make_password('password')
+        offset = User.objects.count()
+        user_ids = array('q')
+        for start in range(offset, offset + count, self.batch_size):
+            stop = min(start + self.batch_size, offset + count)
+            user_ids.extend(self.bulk_insert(User, [
+                User(
+                    username=f'user{number}',
+                    email=f'user{number}@foodgram.ru',
+                    first_name='Пользователь',
+                    last_name=str(number),
+                    password=password
+                )
+                for number in range(start, stop)
+            ]))
+        self.stdout.write(f'Пользователей: {len(user_ids)}')
+        return user_ids
+
+    def create_tags(self, count: int) -> array:
+        existing = Tag.objects.count()
+        tags = []
+        for number in range(existing, count):
+            name = (TAG_NAMES[number] if number < len(TAG_NAMES)
+                    else f'Тег {number}')
+            tags.append(Tag(
+                name=name,
+                color=f'#{number * 2654435761 % 0x1000000:06X}',
+                slug=f'tag{number}'
+            ))
+        Tag.objects.bulk_create(tags)
+        self.stdout.write(f'Тегов: {max(count, existing)}')
+        return array('q', Tag.objects.values_list('id', flat=True))
+
+    def create_recipes(self, count: int, image: str, user_ids: array,
+                       tag_ids: array, ingredient_ids: array) -> array:
+        recipe_ids = array('q')
+        recipe_tag = Recipe.tags.through
+        for start in range(0, count, self.batch_size):
+            stop = min(start + self.batch_size, count)
+            with transaction.atomic():
+                ids = self.bulk_insert(Recipe, [
+                    Recipe(
+                        author_id=self.popular(user_ids),
+                        name=f'Рецепт {number}',
+                        image=image,
+                        text=f'Описание рецепта {number}.',
+                        cooking_time=self.rng.randint(5, 180)
+                    )
+                    for number in range(start, stop)
+                ])
+                tags, ingredients = [], []
+                max_tags = min(3, len(tag_ids))
+                for recipe_id in ids:
+                    for tag_id in self.rng.sample(
+                            tag_ids, self.rng.randint(1, max_tags)):
+                        tags.append(recipe_tag(
+                            recipe_id=recipe_id, tag_id=tag_id))
+                    size = min(round(self.rng.triangular(
+                        *INGREDIENTS_PER_RECIPE)), len(ingredient_ids))
+                    for ingredient_id in self.rng.sample(ingredient_ids, size):
+                        ingredients.append(IngredientRecipe(
+                            recipe_id=recipe_id,
+                            ingredient_id=ingredient_id,
+                            amount=self.rng.randint(1, 500)
+                        ))
+                recipe_tag.objects.bulk_create(tags)
+                IngredientRecipe.objects.bulk_create(
+                    ingredients, batch_size=self.batch_size)
+                search.update_index(list(ids))
+            recipe_ids.extend(ids)
+            self.stdout.write(f'Рецептов: {len(recipe_ids)} из {count}')
+        return recipe_ids
+
+    def create_pairs(self, model, owner_field: str, target_field: str,
+                     count: int, owner_ids: array, target_ids: array) -> None:
+        """Создает до count связей «пользователь — объект» с популярными
+        объектами.
+
+        Повторы внутри пачки отбрасываются сразу, между пачками —
+        уникальным ограничением модели, поэтому число созданных связей
+        считается по новым id после каждой пачки.
+        """
+        if not owner_ids or not target_ids:
+            return
+        attempted = created = 0
+        while attempted < count:
+            size = min(self.batch_size, count - attempted)
+            pairs = set()
+            for _ in range(size):
+                owner_id = self.rng.choice(owner_ids)
+                target_id = self.popular(target_ids)
+                if owner_id != target_id or model is not Subscription:
+                    pairs.add((owner_id, target_id))
+            last_id = model.objects.aggregate(
+                last_id=Max('id'))['last_id'] or 0
+            model.objects.bulk_create(
+                (model(**{owner_field: owner_id, target_field: target_id})
+                 for owner_id, target_id in pairs),
+                ignore_conflicts=True
+            )
+            attempted += size
+            created += model.objects.filter(id__gt=last_id).count()
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {created} '
+                f'(попыток {attempted} из {count})')
@@ -0,0 +1,49 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from recipes.importer import CATALOGS, ImportDataError, import_catalog
+
+
+class Command(BaseCommand):
+    help = ('Импорт ингредиентов или тегов из CSV или JSON. Повторный '
+            'импорт добавляет новые и обновляет изменившиеся записи.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу .csv или .json.')
+        parser.add_argument(
+            '--catalog', choices=CATALOGS,
+            help='Справочник. По умолчанию определяется по имени файла.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Импортировать файл, даже если он не менялся.')
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY на PostgreSQL.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        name, extension = os.path.splitext(os.path.basename(path))
+        catalog = options['catalog'] or name
+        file_format = extension.lstrip('.').lower()
+        if catalog not in CATALOGS:
+            raise CommandError(
+                f'Укажите справочник: {", ".join(CATALOGS)}.')
+        if file_format not in ('csv', 'json'):
+            raise CommandError('Поддерживаются только файлы .csv и .json.')
+        try:
+            counts = import_catalog(
+                catalog, path, file_format, options['batch_size'],
+                force=options['force'], use_copy=not options['no_copy'])
+        except (OSError, ImportDataError, DatabaseError) as error:
+            raise CommandError(f'Импорт {path} не выполнен: {error}')
+        if counts is None:
+            self.stdout.write(self.style.SUCCESS(
+                f'{path} не изменился с прошлого импорта, пропущен.'))
+            return
+        inserted, updated, skipped = counts
+        self.stdout.write(self.style.SUCCESS(
+            f'{path}: добавлено {inserted}, обновлено {updated}, '
+            f'пропущено {skipped}.'))
@@ -0,0 +1,39 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.transfer import TransferError, import_recipes
+
+
+class Command(BaseCommand):
+    help = ('Загрузка рецептов из NDJSON, выгруженного export_recipes. '
+            'Прерванная загрузка продолжается с последней сохраненной '
+            'пачки. Изображения копируются в media отдельно.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--source',
+            help='Имя, под которым сохраняется прогресс. '
+                 'По умолчанию имя файла.')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать загрузку сначала.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        source = options['source'] or os.path.basename(path)
+        imported = None
+        try:
+            for imported in import_recipes(
+                    path, source, options['chunk_size'],
+                    restart=options['restart']):
+                self.stdout.write(f'Загружено рецептов: {imported}')
+        except (OSError, TransferError) as error:
+            raise CommandError(f'Загрузка {path} остановлена: {error}')
+        if imported is None:
+            self.stdout.write(self.style.SUCCESS(
+                f'{path}: новых рецептов нет.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Успешно загружено!'))
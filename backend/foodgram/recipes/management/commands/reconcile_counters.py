@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import COUNTERS, reconcile
+
+
+class Command(BaseCommand):
+    help = ('Пересчет денормализованных счетчиков рецептов и пользователей '
+            'по исходным таблицам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fields = {}
+        for _, target, _, field in COUNTERS:
+            fields.setdefault(target, []).append(field)
+        for model, model_fields in fields.items():
+            fixed = reconcile(model, model_fields, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: '
+                f'исправлено объектов {fixed}.'))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from recipes import shopping_list
+from recipes.models import ShoppingListItem
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Сверка сохраненных списков покупок с рецептами в корзинах '
+            'пользователей. С флагом --rebuild расхождения исправляются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Пересобрать списки покупок с расхождениями.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        checked = mismatched = 0
+        last_id = 0
+        while True:
+            batch = list(user_ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+            expected = shopping_list.get_expected(batch)
+            actual = shopping_list.get_actual(batch)
+            broken = [
+                user_id for user_id in batch
+                if expected.get(user_id, {}) != actual.get(user_id, {})
+            ]
+            if broken and options['rebuild']:
+                shopping_list.rebuild(broken, expected)
+            checked += len(batch)
+            mismatched += len(broken)
+        message = (f'Проверено пользователей: {checked}, '
+                   f'списков с расхождениями: {mismatched}.')
+        if options['rebuild']:
+            ShoppingListItem.objects.filter(total_amount__lte=0).delete()
+            self.stdout.write(self.style.SUCCESS(message + ' Исправлено.'))
+        elif mismatched:
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,76 @@
+from django.db import migrations
+
+POSTGRESQL_INDEX = (
+    'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector',
+    """
+    CREATE FUNCTION recipes_recipe_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian',
+                                  coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('russian',
+                                  coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_search_vector
+    BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+    FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector()
+    """,
+    """
+    UPDATE recipes_recipe SET search_vector =
+        setweight(to_tsvector('russian', name), 'A') ||
+        setweight(to_tsvector('russian', text), 'B')
+    """,
+    'CREATE INDEX recipes_recipe_search_vector_gin '
+    'ON recipes_recipe USING gin (search_vector)',
+)
+POSTGRESQL_DROP_INDEX = (
+    'DROP TRIGGER recipes_recipe_search_vector ON recipes_recipe',
+    'DROP FUNCTION recipes_recipe_search_vector()',
+    'ALTER TABLE recipes_recipe DROP COLUMN search_vector',
+)
+SQLITE_INDEX = (
+    "CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5("
+    "name, text, tokenize='unicode61 remove_diacritics 2')",
+    'INSERT INTO recipes_recipe_fts (rowid, name, text) '
+    'SELECT id, name, text FROM recipes_recipe',
+)
+SQLITE_DROP_INDEX = ('DROP TABLE recipes_recipe_fts',)
+
+
+def create_index(apps, schema_editor):
+    """Создает поисковый индекс рецептов для текущей СУБД.
+
+    В PostgreSQL столбец tsvector заполняет триггер, поэтому индекс
+    актуален и при массовых вставках. В SQLite, используемой локально
+    и в тестах, индекс — отдельная таблица FTS5, которую обновляют
+    сигналы: триггеры на recipes_recipe SQLite теряла бы при
+    пересоздании таблицы миграциями.
+    """
+    vendor = schema_editor.connection.vendor
+    statements = {'postgresql': POSTGRESQL_INDEX,
+                  'sqlite': SQLITE_INDEX}.get(vendor, ())
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'postgresql': POSTGRESQL_DROP_INDEX,
+                  'sqlite': SQLITE_DROP_INDEX}.get(vendor, ())
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_importprogress'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
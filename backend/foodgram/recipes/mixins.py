@@ -0,0 +1,24 @@
+class CountersMixin:
+    """Не записывает денормализованные счетчики при полном сохранении
+    существующего объекта.
+
+    Счетчики меняются только атомарными UPDATE с F(). Полное сохранение
+    объекта, загруженного раньше, например в админке или при смене
+    пароля, иначе затерло бы одновременные изменения старыми
+    значениями.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not args and not self._state.adding
+                and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
@@ -4,6 +4,8 @@ from django.db import models
 
 from users.models import User
 
+from .mixins import CountersMixin
+from .storage import ContentHashStorage
 from .validators import validate_slug
 
 
@@ -64,7 +66,7 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(CountersMixin, models.Model):
     """Модель рецептов."""
 
     author = models.ForeignKey(
@@ -79,6 +81,7 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/',
+        storage=ContentHashStorage(),
         verbose_name='Изображение'
     )
     text = models.TextField(
@@ -107,6 +110,23 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name='Добавлений в избранное'
+    )
+    carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в список покупок'
+    )
+
+    counter_fields = ('favorites_count', 'carts_count')
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -196,3 +216,148 @@ class Favorite(models.Model):
                 fields=['user', 'recipe'],
                 name='unique_user_favorite')
         ]
+
+
+class ShoppingListItem(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя.
+
+    Поддерживается при добавлении и удалении рецептов из списка покупок
+    и при изменении ингредиентов рецепта. Сверяется с исходными данными
+    командой shopping_lists.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.IntegerField(
+        default=0,
+        verbose_name='Общее количество'
+    )
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_ingredient')
+        ]
+
+
+class ModelVersion(models.Model):
+    """Счетчик изменений модели для проверки актуальности кэша."""
+
+    model = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='Модель'
+    )
+    version = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Версия'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+
+    class Meta:
+        verbose_name = 'Версия модели'
+        verbose_name_plural = 'Версии моделей'
+
+    def __str__(self):
+        return f'{self.model} v{self.version}'
+
+
+class FeedItem(models.Model):
+    """Запись ленты подписчика о новом рецепте автора.
+
+    Создается при публикации рецепта для всех подписчиков автора,
+    пока их не больше FEED_FANOUT_THRESHOLD. Рецепты более популярных
+    авторов подмешиваются в ленту при чтении.
+    """
+
+    subscriber = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['subscriber', 'recipe'],
+                name='unique_subscriber_recipe')
+        ]
+
+
+class CatalogImport(models.Model):
+    """Контрольная сумма последнего импортированного файла справочника."""
+
+    catalog = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name='Справочник'
+    )
+    checksum = models.CharField(
+        max_length=64,
+        verbose_name='Контрольная сумма'
+    )
+    imported_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата импорта'
+    )
+
+    class Meta:
+        verbose_name = 'Импорт справочника'
+        verbose_name_plural = 'Импорты справочников'
+
+    def __str__(self):
+        return self.catalog
+
+
+class ImportProgress(models.Model):
+    """Место, до которого импортирован файл рецептов."""
+
+    source = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Источник'
+    )
+    offset = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Смещение в байтах'
+    )
+    imported = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Импортировано рецептов'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+
+    class Meta:
+        verbose_name = 'Прогресс импорта'
+        verbose_name_plural = 'Прогресс импорта'
+
+    def __str__(self):
+        return f'{self.source}: {self.imported}'
@@ -0,0 +1,21 @@
+from django.db import connections
+
+
+def delete_rows(queryset) -> int:
+    """Удаляет строки queryset одним DELETE без выборки объектов
+    и возвращает число удаленных строк.
+
+    Сигналы pre_delete и post_delete не отправляются, каскадные
+    удаления не выполняются. Нужен там, где вызывающий код сам меняет
+    счетчики и списки покупок: delete() отправил бы сигналы, и эти
+    изменения применились бы второй раз.
+    """
+    connection = connections[queryset.db]
+    model = queryset.model
+    quote = connection.ops.quote_name
+    subquery, params = queryset.values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {quote(model._meta.pk.column)} IN ({subquery})', params)
+        return cursor.rowcount
@@ -0,0 +1,79 @@
+import re
+
+from django.db import connection
+from django.db.models import ExpressionWrapper, F, FloatField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Ln
+
+from foodgram.settings import SEARCH_POPULARITY_WEIGHT
+
+# Индекс создается миграцией 0011_recipe_search_index: в PostgreSQL
+# столбец search_vector с триггером, в SQLite таблица FTS5.
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+INDEXED_FIELDS = {'name', 'text'}
+# Вес совпадений в названии и в описании рецепта для bm25.
+FTS_WEIGHTS = (10.0, 1.0)
+
+
+def update_index(ids) -> None:
+    """Переиндексирует рецепты в таблице FTS5. В PostgreSQL индекс
+    обновляет триггер, и вызов ничего не делает."""
+    if connection.vendor != 'sqlite' or not ids:
+        return
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', ids)
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+            f'SELECT id, name, text FROM recipes_recipe '
+            f'WHERE id IN ({placeholders})', ids)
+
+
+def remove_from_index(ids) -> None:
+    if connection.vendor != 'sqlite' or not ids:
+        return
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', ids)
+
+
+def get_fts_query(query: str) -> str:
+    """Собирает запрос FTS5 из слов запроса: каждое слово ищется
+    как префикс, что отчасти заменяет отсутствующий в SQLite стемминг."""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def search(queryset, query: str):
+    """Оставляет рецепты, подходящие под запрос, и сортирует их
+    по релевантности, умноженной на логарифм числа добавлений
+    в избранное."""
+    if not re.search(r'\w', query):
+        return queryset.none()
+    if connection.vendor == 'postgresql':
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        matches = RawSQL(
+            f'SELECT id FROM recipes_recipe '
+            f'WHERE search_vector @@ {tsquery}', (query,))
+        rank = RawSQL(
+            f'ts_rank(recipes_recipe.search_vector, {tsquery})', (query,),
+            output_field=FloatField())
+    else:
+        query = get_fts_query(query)
+        weights = ', '.join(map(str, FTS_WEIGHTS))
+        matches = RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (query,))
+        rank = RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'AND rowid = recipes_recipe.id', (query,),
+            output_field=FloatField())
+    popularity = Value(1.0) + Ln(F('favorites_count') + 1) * Value(
+        SEARCH_POPULARITY_WEIGHT)
+    return queryset.filter(pk__in=matches).annotate(
+        search_rank=ExpressionWrapper(
+            rank * popularity, output_field=FloatField())
+    ).order_by('-search_rank', '-pub_date')
@@ -0,0 +1,135 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .models import IngredientRecipe, Shopping_cart, ShoppingListItem
+
+
+def get_recipe_amounts(recipe) -> dict:
+    """Возвращает количества ингредиентов рецепта по их id."""
+    return dict(IngredientRecipe.objects.filter(
+        recipe=recipe).values_list('ingredient_id', 'amount'))
+
+
+def change_shopping_lists(user_ids, deltas: dict) -> None:
+    """Прибавляет к спискам покупок пользователей изменения количеств.
+
+    Недостающие позиции создаются с нулевым количеством, затем все
+    позиции обновляются одним UPDATE. Позиции с нулевым количеством
+    не удаляются, чтобы не конфликтовать с параллельными изменениями;
+    при чтении они отфильтровываются.
+    """
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    user_ids = list(user_ids)
+    if not deltas or not user_ids:
+        return
+    with transaction.atomic():
+        ShoppingListItem.objects.bulk_create(
+            (ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+             for user_id in user_ids
+             for ingredient_id, delta in deltas.items() if delta > 0),
+            ignore_conflicts=True
+        )
+        ShoppingListItem.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas
+        ).update(total_amount=F('total_amount') + Case(
+            *(When(ingredient_id=ingredient_id, then=Value(delta))
+              for ingredient_id, delta in deltas.items()),
+            output_field=IntegerField()
+        ))
+
+
+def get_total_amounts(recipe_ids) -> dict:
+    """Суммирует количества ингредиентов нескольких рецептов."""
+    return dict(IngredientRecipe.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values('ingredient_id').order_by().annotate(
+        total=Sum('amount')
+    ).values_list('ingredient_id', 'total'))
+
+
+def add_recipe(user, recipe) -> None:
+    """Добавляет ингредиенты рецепта в список покупок пользователя."""
+    change_shopping_lists([user.pk], get_recipe_amounts(recipe))
+
+
+def remove_recipe(user, recipe) -> None:
+    """Вычитает ингредиенты рецепта из списка покупок пользователя."""
+    change_shopping_lists([user.pk], {
+        ingredient_id: -amount
+        for ingredient_id, amount in get_recipe_amounts(recipe).items()
+    })
+
+
+def add_recipes(user, recipe_ids) -> None:
+    """Добавляет ингредиенты нескольких рецептов в список покупок
+    пользователя одним изменением."""
+    if recipe_ids:
+        change_shopping_lists([user.pk], get_total_amounts(recipe_ids))
+
+
+def remove_recipes(user, recipe_ids) -> None:
+    if recipe_ids:
+        change_shopping_lists([user.pk], {
+            ingredient_id: -amount
+            for ingredient_id, amount in get_total_amounts(
+                recipe_ids).items()
+        })
+
+
+def change_recipe(recipe, old_amounts: dict, new_amounts: dict) -> None:
+    """Переносит изменение ингредиентов рецепта в списки покупок
+    всех пользователей, добавивших его в корзину."""
+    deltas = {
+        ingredient_id: (new_amounts.get(ingredient_id, 0)
+                        - old_amounts.get(ingredient_id, 0))
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    }
+    change_shopping_lists(
+        Shopping_cart.objects.filter(
+            recipe=recipe).values_list('user_id', flat=True),
+        deltas
+    )
+
+
+def get_expected(user_ids) -> dict:
+    """Считает списки покупок пользователей по исходным данным."""
+    expected = defaultdict(dict)
+    for user_id, ingredient_id, total in IngredientRecipe.objects.filter(
+        recipe__shopping_cart__user_id__in=user_ids
+    ).values(
+        'recipe__shopping_cart__user_id', 'ingredient_id'
+    ).order_by().annotate(
+        total=Sum('amount')
+    ).values_list('recipe__shopping_cart__user_id', 'ingredient_id', 'total'):
+        expected[user_id][ingredient_id] = total
+    return expected
+
+
+def get_actual(user_ids) -> dict:
+    """Возвращает сохраненные списки покупок пользователей."""
+    actual = defaultdict(dict)
+    for user_id, ingredient_id, total in ShoppingListItem.objects.filter(
+        user_id__in=user_ids, total_amount__gt=0
+    ).values_list('user_id', 'ingredient_id', 'total_amount'):
+        actual[user_id][ingredient_id] = total
+    return actual
+
+
+def rebuild(user_ids, expected: dict = None) -> None:
+    """Пересобирает списки покупок пользователей с нуля."""
+    user_ids = list(user_ids)
+    if expected is None:
+        expected = get_expected(user_ids)
+    with transaction.atomic():
+        ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                             total_amount=total)
+            for user_id in user_ids
+            for ingredient_id, total in expected.get(user_id, {}).items()
+        )
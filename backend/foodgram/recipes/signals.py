@@ -0,0 +1,117 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import User
+
+from . import search, shopping_list
+from .counters import COUNTERS, change_counter
+from .models import Ingredient, IngredientRecipe, Recipe, Shopping_cart, Tag
+from .rows import delete_rows
+from .versions import bump_version
+
+# Поля пользователя, которые видны в карточке рецепта.
+USER_PUBLIC_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_catalog_version(sender, **kwargs) -> None:
+    """Отмечает изменение справочника тегов или ингредиентов."""
+    bump_version(sender)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def bump_recipe_version(sender, **kwargs) -> None:
+    """Отмечает изменение рецептов для сброса кэша их списка."""
+    bump_version(sender)
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def touch_recipe(instance, **kwargs) -> None:
+    """Обновляет дату изменения рецепта при правке его ингредиентов
+    в обход рецепта, например в админке: по ней строятся ETag
+    и ключи кэша карточек."""
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        updated_at=timezone.now())
+
+
+@receiver(pre_save, sender=IngredientRecipe)
+def remember_amount(instance, **kwargs) -> None:
+    """Запоминает прежние ингредиент и количество строки рецепта."""
+    instance.old_amount = None
+    if instance.pk is not None:
+        instance.old_amount = IngredientRecipe.objects.filter(
+            pk=instance.pk).values_list('ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=IngredientRecipe)
+def save_to_shopping_lists(instance, **kwargs) -> None:
+    """Переносит правку ингредиента рецепта в обход API, например
+    в админке, в списки покупок. API меняет ингредиенты массовыми
+    запросами без сигналов и обновляет списки само."""
+    old_amount = getattr(instance, 'old_amount', None)
+    shopping_list.change_recipe(
+        instance.recipe_id, dict([old_amount] if old_amount else []),
+        {instance.ingredient_id: instance.amount})
+
+
+@receiver(post_delete, sender=IngredientRecipe)
+def delete_from_shopping_lists(instance, **kwargs) -> None:
+    shopping_list.change_recipe(
+        instance.recipe_id, {instance.ingredient_id: instance.amount}, {})
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_from_shopping_lists(instance, **kwargs) -> None:
+    """Вычитает ингредиенты удаляемого рецепта из списков покупок.
+
+    Корзины рецепта удаляются сразу, без сигналов: иначе при каскадном
+    удалении ингредиентов рецепта их количества вычитались бы
+    второй раз.
+    """
+    shopping_list.change_recipe(
+        instance, shopping_list.get_recipe_amounts(instance), {})
+    delete_rows(Shopping_cart.objects.filter(recipe=instance))
+
+
+@receiver((post_save, post_delete), sender=User)
+def bump_user_version(sender, update_fields=None, **kwargs) -> None:
+    """Отмечает изменение пользователей, кроме сохранения полей,
+    которых нет в карточке рецепта, например даты входа."""
+    if update_fields is None or update_fields & USER_PUBLIC_FIELDS:
+        bump_version(sender)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(instance, update_fields, **kwargs) -> None:
+    if update_fields is None or update_fields & search.INDEXED_FIELDS:
+        search.update_index([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(instance, **kwargs) -> None:
+    search.remove_from_index([instance.pk])
+
+
+def connect_counter(source, target, foreign_key: str, field: str) -> None:
+    """Подключает поддержку счетчика field модели target
+    к созданию и удалению объектов source."""
+
+    def increment(instance, created, **kwargs):
+        if created:
+            change_counter(target, getattr(instance, foreign_key), field, 1)
+
+    def decrement(instance, **kwargs):
+        change_counter(target, getattr(instance, foreign_key), field, -1)
+
+    post_save.connect(increment, sender=source, weak=False,
+                      dispatch_uid=f'increment_{field}')
+    post_delete.connect(decrement, sender=source, weak=False,
+                        dispatch_uid=f'decrement_{field}')
+
+
+for counter in COUNTERS:
+    connect_counter(*counter)
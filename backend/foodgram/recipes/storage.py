@@ -0,0 +1,37 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentHashStorage(FileSystemStorage):
+    """Хранилище, именующее файлы по хэшу содержимого.
+
+    Одинаковые загрузки сохраняются один раз, а содержимое файла
+    по адресу никогда не меняется. Из-за этого один файл может
+    использоваться несколькими рецептами: удалять его можно только
+    когда на него не осталось ссылок (см. команду gc_media).
+    Повторная загрузка обновляет время изменения файла, чтобы gc_media
+    с --min-age не удалила его до сохранения рецепта.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest.hexdigest() + extension)
+        if self.exists(name):
+            try:
+                os.utime(self.path(name))
+            except FileNotFoundError:
+                pass
+            else:
+                return name
+        return super().save(name, content, max_length)
@@ -0,0 +1,33 @@
+import io
+
+
+class Echo:
+    """Файлоподобный объект, возвращающий записанную строку.
+
+    Позволяет получать строки csv.writer по одной, не накапливая их.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+class CopyFile(io.RawIOBase):
+    """Файлоподобная обертка над генератором строк для COPY."""
+
+    def __init__(self, lines) -> None:
+        self.lines = lines
+        self.buffer = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line.encode()
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
@@ -0,0 +1,234 @@
+import json
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+
+from users.models import User
+
+from . import search
+from .counters import change_counter
+from .models import ImportProgress, Ingredient, IngredientRecipe, Recipe, Tag
+from .versions import bump_version
+
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+TAG_FIELDS = ('name', 'color', 'slug')
+
+
+class TransferError(ValueError):
+    """Ошибка в данных импортируемого файла рецептов."""
+
+
+def serialize_chunk(recipes: list):
+    """Собирает записи пачки рецептов, загружая их связи двумя
+    запросами на всю пачку."""
+    ids = [recipe.pk for recipe in recipes]
+    tags = defaultdict(list)
+    for recipe_id, *values in Recipe.tags.through.objects.filter(
+        recipe_id__in=ids
+    ).values_list('recipe_id', *(f'tag__{field}' for field in TAG_FIELDS)):
+        tags[recipe_id].append(dict(zip(TAG_FIELDS, values)))
+    ingredients = defaultdict(list)
+    for recipe_id, name, unit, amount in IngredientRecipe.objects.filter(
+        recipe_id__in=ids
+    ).values_list('recipe_id', 'ingredient__name',
+                  'ingredient__measurement_unit', 'amount'):
+        ingredients[recipe_id].append(
+            {'name': name, 'measurement_unit': unit, 'amount': amount})
+    for recipe in recipes:
+        yield {
+            'id': recipe.pk,
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'image': recipe.image.name,
+            'pub_date': recipe.pub_date.isoformat(),
+            'author': {
+                field: getattr(recipe.author, field)
+                for field in AUTHOR_FIELDS
+            },
+            'tags': tags[recipe.pk],
+            'ingredients': ingredients[recipe.pk],
+        }
+
+
+def export_recipes(chunk_size: int):
+    """Отдает рецепты строками NDJSON.
+
+    Рецепты читаются серверным курсором, связи догружаются пачками,
+    поэтому память не зависит от количества рецептов.
+    """
+    recipes = Recipe.objects.select_related('author').order_by('pk').only(
+        'pk', 'name', 'text', 'cooking_time', 'image', 'pub_date',
+        *(f'author__{field}' for field in AUTHOR_FIELDS)
+    ).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(recipes, chunk_size))
+        if not chunk:
+            return
+        for record in serialize_chunk(chunk):
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def get_or_create_authors(records: list) -> dict:
+    """Сопоставляет авторов по email, недостающих создает
+    без пароля."""
+    authors = {record['author']['email']: record['author']
+               for record in records}
+    User.objects.bulk_create(
+        (User(password=make_password(None), **author)
+         for email, author in authors.items()),
+        ignore_conflicts=True
+    )
+    ids = dict(User.objects.filter(
+        email__in=authors).values_list('email', 'id'))
+    missing = authors.keys() - ids.keys()
+    if missing:
+        raise TransferError(
+            f'Не удалось создать авторов {sorted(missing)}: '
+            f'имя пользователя уже занято.')
+    return ids
+
+
+def get_or_create_tags(records: list) -> dict:
+    tags = {tag['slug']: tag for record in records for tag in record['tags']}
+    Tag.objects.bulk_create(
+        (Tag(**{field: tag[field] for field in TAG_FIELDS})
+         for tag in tags.values()),
+        ignore_conflicts=True
+    )
+    ids = dict(Tag.objects.filter(slug__in=tags).values_list('slug', 'id'))
+    missing = tags.keys() - ids.keys()
+    if missing:
+        raise TransferError(
+            f'Не удалось создать теги {sorted(missing)}: название или цвет '
+            f'уже заняты.')
+    return ids
+
+
+def get_or_create_ingredients(records: list) -> dict:
+    keys = {
+        (ingredient['name'], ingredient['measurement_unit'])
+        for record in records for ingredient in record['ingredients']
+    }
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=name, measurement_unit=unit)
+         for name, unit in keys),
+        ignore_conflicts=True
+    )
+    return {
+        (name, unit): pk
+        for pk, name, unit in Ingredient.objects.filter(
+            name__in={name for name, _ in keys}
+        ).values_list('id', 'name', 'measurement_unit')
+        if (name, unit) in keys
+    }
+
+
+def insert_recipes(recipes: list) -> None:
+    """Вставляет рецепты одним запросом и проставляет им id."""
+    if connection.features.can_return_rows_from_bulk_insert:
+        Recipe.objects.bulk_create(recipes)
+        return
+    last_id = Recipe.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    Recipe.objects.bulk_create(recipes)
+    for recipe, pk in zip(recipes, Recipe.objects.filter(
+            id__gt=last_id).order_by('id').values_list('id', flat=True)):
+        recipe.pk = pk
+
+
+def import_chunk(records: list) -> None:
+    """Импортирует пачку рецептов, заменяя внешние ключи
+    на id этой базы."""
+    try:
+        authors = get_or_create_authors(records)
+        tags = get_or_create_tags(records)
+        ingredients = get_or_create_ingredients(records)
+        recipes = [
+            Recipe(
+                author_id=authors[record['author']['email']],
+                name=record['name'],
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=record['image'],
+            )
+            for record in records
+        ]
+        pub_dates = [parse_datetime(record['pub_date']) for record in records]
+    except (KeyError, TypeError) as error:
+        raise TransferError(f'В записи рецепта нет поля {error}.')
+    insert_recipes(recipes)
+    # auto_now_add перезаписывает дату при вставке, исходная
+    # дата публикации восстанавливается отдельным запросом.
+    for recipe, pub_date in zip(recipes, pub_dates):
+        recipe.pub_date = pub_date
+    Recipe.objects.bulk_update(recipes, ('pub_date',))
+    search.update_index([recipe.pk for recipe in recipes])
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe_id=recipe.pk, tag_id=tags[tag['slug']])
+        for recipe, record in zip(recipes, records)
+        for tag in record['tags']
+    )
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(
+            recipe_id=recipe.pk,
+            ingredient_id=ingredients[
+                ingredient['name'], ingredient['measurement_unit']],
+            amount=ingredient['amount']
+        )
+        for recipe, record in zip(recipes, records)
+        for ingredient in record['ingredients']
+    )
+    for author_id, count in Counter(
+            recipe.author_id for recipe in recipes).items():
+        change_counter(User, author_id, 'recipes_count', count)
+    # Массовые вставки не отправляют сигналы.
+    for model in (Tag, Ingredient, Recipe, IngredientRecipe):
+        bump_version(model)
+
+
+def read_chunks(file, offset: int, chunk_size: int):
+    """Читает файл NDJSON пачками, начиная с байта offset.
+    Отдает записи пачки и смещение ее конца."""
+    file.seek(offset)
+    records = []
+    for line in file:
+        offset += len(line)
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            raise TransferError(f'Некорректная строка JSON на байте {offset}.')
+        if len(records) == chunk_size:
+            yield records, offset
+            records = []
+    if records:
+        yield records, offset
+
+
+def import_recipes(path: str, source: str, chunk_size: int,
+                   restart: bool = False):
+    """Импортирует рецепты из NDJSON пачками, каждую в своей транзакции.
+
+    Смещение последней сохраненной пачки записывается в той же
+    транзакции, поэтому прерванный импорт продолжается с места
+    остановки без повторов. Отдает количество импортированных рецептов
+    после каждой пачки.
+    """
+    progress, _ = ImportProgress.objects.get_or_create(source=source)
+    if restart:
+        progress.offset = progress.imported = 0
+        progress.save()
+    with open(path, 'rb') as file:
+        for records, offset in read_chunks(
+                file, progress.offset, chunk_size):
+            with transaction.atomic():
+                import_chunk(records)
+                progress.offset = offset
+                progress.imported += len(records)
+                progress.save()
+            yield progress.imported
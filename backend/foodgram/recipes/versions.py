@@ -0,0 +1,34 @@
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ModelVersion
+
+
+def get_label(model) -> str:
+    return model._meta.label_lower
+
+
+def bump_version(model) -> int:
+    """Увеличивает счетчик изменений модели и возвращает новую версию."""
+    label = get_label(model)
+    versions = ModelVersion.objects.filter(model=label)
+    if versions.update(version=F('version') + 1, updated_at=timezone.now()):
+        return versions.values_list('version', flat=True).get()
+    obj, created = ModelVersion.objects.get_or_create(
+        model=label, defaults={'version': 1})
+    return obj.version
+
+
+def get_versions(*models) -> dict:
+    """Возвращает версии моделей одним запросом.
+
+    Для моделей, которые еще не менялись, версия равна нулю,
+    а дата изменения не определена.
+    """
+    versions = {get_label(model): (0, None) for model in models}
+    versions.update(
+        (label, (version, updated_at))
+        for label, version, updated_at in ModelVersion.objects.filter(
+            model__in=versions).values_list('model', 'version', 'updated_at')
+    )
+    return versions
@@ -4,7 +4,8 @@ from .models import Subscription, User
 
 
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'username', 'email', 'first_name', 'last_name')
+    list_display = ('pk', 'username', 'email', 'first_name', 'last_name',
+                    'recipes_count', 'subscribers_count')
     search_fields = ('username',)
     list_filter = ('email', 'username')
     empty_value_display = '-empty-'
@@ -1,10 +1,12 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from recipes.mixins import CountersMixin
+
 from .validators import validate_username
 
 
-class User(AbstractUser):
+class User(CountersMixin, AbstractUser):
     """Кастомная модель пользователя."""
 
     username = models.CharField(
@@ -27,6 +29,16 @@ class User(AbstractUser):
         'Пароль',
         max_length=150,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False)
+    subscribers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False)
+
+    counter_fields = ('recipes_count', 'subscribers_count')
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = (
         'username',